@@ -0,0 +1,65 @@
+from datetime import date as date_cls
+
+RING_DAYS = 30
+
+
+def empty():
+    return {"sum": 0, "count": 0, "active_days": 0, "last_day": None, "days": {}, "slots": {}}
+
+
+def apply(agg, date, slot, score, old_score=None, new_day=False):
+    # old_score: نمره قبلی همان (date, slot) اگر بازنویسی شده باشد
+    delta = score - (old_score or 0)
+    added = 0 if old_score is not None else 1
+    agg["sum"] += delta
+    agg["count"] += added
+    if new_day:
+        agg["active_days"] += 1
+    if agg["last_day"] is None or date > agg["last_day"]:
+        agg["last_day"] = date
+    slot_entry = agg["slots"].setdefault(slot, [0, 0])
+    slot_entry[0] += delta
+    slot_entry[1] += added
+    days = agg["days"]
+    if date in days:
+        days[date][0] += delta
+        days[date][1] += added
+    elif len(days) < RING_DAYS or date > min(days):
+        days[date] = [score, 1]
+        if len(days) > RING_DAYS:
+            del days[min(days)]
+    return agg
+
+
+def recent_days(agg, limit):
+    return [(d, s / c) for d, (s, c) in sorted(agg["days"].items())[-limit:] if c]
+
+
+def average(agg):
+    return agg["sum"] / agg["count"] if agg["count"] else 0
+
+
+def slot_averages(agg):
+    return {slot: s / c for slot, (s, c) in agg["slots"].items() if c}
+
+
+def streak(agg, today=None):
+    days = sorted(agg["days"], reverse=True)
+    # اگر دیروز و امروز نمره‌ای ثبت نشده، زنجیره شکسته است
+    today = today or date_cls.today()
+    if not days or (today - date_cls.fromisoformat(days[0])).days > 1:
+        return 0
+    count = 0
+    for prev, cur in zip([None] + days, days):
+        if prev is not None and (date_cls.fromisoformat(prev) - date_cls.fromisoformat(cur)).days != 1:
+            break
+        count += 1
+    return count
+
+
+def trend(agg, window=7):
+    values = [avg for _, avg in recent_days(agg, window * 2)]
+    if len(values) <= window:
+        return None
+    recent, before = values[-window:], values[:-window]
+    return sum(recent) / len(recent) - sum(before) / len(before)
@@ -0,0 +1,209 @@
+import os
+import time
+import threading
+from datetime import date as date_cls
+import numpy as np
+
+ANALYTICS_DAYS = int(os.getenv("ANALYTICS_DAYS", 365))
+ANALYTICS_MAX_AGE = int(os.getenv("ANALYTICS_MAX_AGE", 60))
+RISK_WINDOW = int(os.getenv("RISK_WINDOW", 7))
+RISK_DROP = float(os.getenv("RISK_DROP", 1.5))
+RISK_MIN_ENTRIES = 3
+COHORT_WEEKS = 8
+LOAD_BATCH = 100000
+CHUNK_ROWS = 4096
+SCORE_BINS = 11
+
+
+def monday(ordinal):
+    # date.fromordinal(1) دوشنبه است
+    return ordinal - (ordinal - 1) % 7
+
+
+class MoodCube:
+    # لایه ستونی: scores[slot, user_row, day] با int8 (۰ یعنی ثبت نشده)؛ ستون آخر همیشه امروز است.
+    # هیستوگرام نمره هر نوبت و DAU هر روز با هر refresh به صورت افزایشی به‌روز می‌شوند.
+    def __init__(self, slots, days=ANALYTICS_DAYS):
+        self.slots = {slot: i for i, slot in enumerate(slots)}
+        self.days = days
+        self.n = 0
+        self.rows = {}
+        self.versions = {}
+        self.user_ids = np.zeros(0, np.int64)
+        self.joined = np.zeros(0, np.int32)
+        self.scores = np.zeros((len(self.slots), 0, days), np.int8)
+        self.hist = np.zeros((len(self.slots), SCORE_BINS), np.int64)
+        self.dau = np.zeros(days, np.int64)
+        self.end = None
+        self.refreshed = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def start(self):
+        return self.end - self.days + 1
+
+    def _grow(self, n):
+        cap = self.scores.shape[1]
+        if n <= cap:
+            return
+        cap = max(n, cap * 2, CHUNK_ROWS)
+        scores = np.zeros((len(self.slots), cap, self.days), np.int8)
+        scores[:, :self.n] = self.scores[:, :self.n]
+        self.scores = scores
+        self.user_ids = np.resize(self.user_ids, cap)
+        self.joined = np.resize(self.joined, cap)
+
+    def _contribution(self, block):
+        # block: scores[:, rows, cols]
+        hist = np.stack([np.bincount(block[i].ravel(), minlength=SCORE_BINS) for i in range(block.shape[0])])
+        return hist, (block > 0).any(axis=0).sum(axis=0)
+
+    def _account(self, rows, sign):
+        for i in range(0, len(rows), CHUNK_ROWS):
+            hist, dau = self._contribution(self.scores[:, rows[i:i + CHUNK_ROWS]])
+            self.hist += sign * hist
+            self.dau += sign * dau
+
+    def _shift(self, end):
+        if self.end is None:
+            self.end = end
+            return
+        shift = min(end - self.end, self.days)
+        if shift <= 0:
+            return
+        for i in range(0, self.n, CHUNK_ROWS):
+            hist, _ = self._contribution(self.scores[:, i:i + CHUNK_ROWS, :shift])
+            self.hist -= hist
+        self.scores[:, :self.n, :self.days - shift] = self.scores[:, :self.n, shift:]
+        self.scores[:, :self.n, self.days - shift:] = 0
+        self.dau[:self.days - shift] = self.dau[shift:]
+        self.dau[self.days - shift:] = 0
+        self.end = end
+
+    def refresh(self, storage, today=None, max_age=0):
+        today = (today or date_cls.today()).toordinal()
+        with self._lock:
+            # پیمایش جدول users برای ۱۰۰ هزار کاربر چند ده میلی‌ثانیه است؛ آمار تا max_age ثانیه کهنه قبول می‌شود
+            if self.end == today and time.monotonic() - self.refreshed < max_age:
+                return 0
+            self.refreshed = time.monotonic()
+            before = self.end
+            self._shift(today)
+            changed = []
+            for user_id, joined, version in storage.iter_users():
+                if self.versions.get(user_id) == version:
+                    continue
+                self.versions[user_id] = version
+                row = self.rows.get(user_id)
+                if row is None:
+                    row = self.rows[user_id] = self.n
+                    self._grow(self.n + 1)
+                    self.n += 1
+                    self.user_ids[row] = user_id
+                    try:
+                        self.joined[row] = date_cls.fromisoformat(joined[:10]).toordinal()
+                    except (TypeError, ValueError):
+                        self.joined[row] = today
+                changed.append(row)
+            if changed:
+                changed = np.array(sorted(changed))
+                self._account(changed, -1)
+                self.scores[:, changed] = 0
+                # بعد از ساخت اولیه فقط کاربرانی که version شان عوض شده دوباره خوانده می‌شوند
+                full = len(changed) > self.n // 2
+                since = date_cls.fromordinal(self.start).isoformat()
+                self._load(storage.iter_moods_since(since, None if full else self.user_ids[changed].tolist()))
+                self._account(changed, 1)
+            if len(changed) or before != self.end:
+                self._cache.clear()
+            return len(changed)
+
+    def _load(self, rows):
+        start, days = self.start, self.days
+        columns = {}
+        batch = []
+        for user_id, date, slot, score in rows:
+            s = self.slots.get(slot)
+            row = self.rows.get(user_id)
+            if s is None or row is None:
+                continue
+            col = columns.get(date)
+            if col is None:
+                col = columns[date] = date_cls.fromisoformat(date).toordinal() - start
+            if 0 <= col < days:
+                batch.append((s, row, col, score))
+            if len(batch) >= LOAD_BATCH:
+                self._assign(batch)
+                batch = []
+        if batch:
+            self._assign(batch)
+
+    def _assign(self, batch):
+        s, row, col, score = np.array(batch, dtype=np.int64).T
+        self.scores[s, row, col] = score
+
+    def _cached(self, key, compute):
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = compute()
+            return self._cache[key]
+
+    def daily_active(self, days=30):
+        days = min(days, self.days)
+        with self._lock:
+            return [(date_cls.fromordinal(self.end - days + 1 + i).isoformat(), int(v))
+                    for i, v in enumerate(self.dau[-days:])]
+
+    def slot_distribution(self):
+        # برای هر نوبت: تعداد نمره‌های ۱ تا ۱۰ و میانگین
+        with self._lock:
+            result = {}
+            for slot, i in self.slots.items():
+                counts = self.hist[i, 1:]
+                total = int(counts.sum())
+                mean = float((counts * np.arange(1, SCORE_BINS)).sum() / total) if total else 0
+                result[slot] = (counts.tolist(), mean)
+            return result
+
+    def retention(self, weeks=COHORT_WEEKS):
+        return self._cached(("retention", weeks), lambda: self._retention(weeks))
+
+    def _retention(self, weeks):
+        # کوهورت = هفته عضویت (دوشنبه تا یکشنبه)؛ ردیف k = درصد کاربران کوهورت که در هفته k بعد از عضویت فعال بودند
+        this_week = monday(self.end)
+        first = max(this_week - 7 * (weeks - 1), monday(self.start + 6))
+        joined_week = monday(self.joined[:self.n].astype(np.int64))
+        members = np.nonzero(joined_week >= first)[0]
+        cols = slice(first - self.start, self.days)
+        active = (self.scores[:, members, cols] > 0).any(axis=0)
+        week_starts = np.arange(0, active.shape[1], 7)
+        weekly = np.add.reduceat(active, week_starts, axis=1) > 0 if active.size else np.zeros((0, len(week_starts)), bool)
+        cohorts = []
+        for w, cohort_start in enumerate(range(first, this_week + 1, 7)):
+            mask = joined_week[members] == cohort_start
+            size = int(mask.sum())
+            rates = (weekly[mask, w:].mean(axis=0) * 100).round(1).tolist() if size else []
+            cohorts.append((date_cls.fromordinal(cohort_start).isoformat(), size, rates))
+        return cohorts
+
+    def at_risk(self, window=RISK_WINDOW, drop=RISK_DROP, limit=10):
+        return self._cached(("risk", window, drop, limit), lambda: self._at_risk(window, drop, limit))
+
+    def _at_risk(self, window, drop, limit):
+        # افت میانگین نمره در window روز اخیر نسبت به window روز قبل از آن
+        block = self.scores[:, :self.n, -2 * window:]
+        sums = block.sum(axis=0, dtype=np.int32)
+        counts = (block > 0).sum(axis=0, dtype=np.int32)
+        before_n, recent_n = counts[:, :window].sum(axis=1), counts[:, window:].sum(axis=1)
+        valid = (before_n >= RISK_MIN_ENTRIES) & (recent_n >= RISK_MIN_ENTRIES)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            before = sums[:, :window].sum(axis=1) / before_n
+            recent = sums[:, window:].sum(axis=1) / recent_n
+        delta = np.where(valid, recent - before, 0)
+        risky = np.nonzero(delta <= -drop)[0]
+        worst = risky[np.argsort(delta[risky])[:limit]]
+        return len(risky), [(int(self.user_ids[r]), float(before[r]), float(recent[r])) for r in worst]
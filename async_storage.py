@@ -0,0 +1,57 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from metrics import STORAGE_LATENCY, timed
+
+IO_WORKERS = int(os.getenv("IO_WORKERS", 8))
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+    return _executor
+
+
+async def run_io(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def cancel_task(task):
+    # لغو یک task پس‌زمینه و صبر تا واقعاً تمام شود؛ stop() سرویس‌ها با همین منتظر پایان حلقه‌شان می‌مانند
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def shutdown_io():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+class AsyncStorage:
+    # هر متد Storage را به یک نسخه awaitable تبدیل می‌کند که در thread pool اجرا می‌شود
+    def __init__(self, storage):
+        self.sync = storage
+
+    def __getattr__(self, name):
+        func = getattr(self.sync, name)
+        if not callable(func):
+            return func
+
+        async def call(*args, **kwargs):
+            with timed(STORAGE_LATENCY, op=name):
+                return await run_io(func, *args, **kwargs)
+        call.__name__ = name
+        setattr(self, name, call)
+        return call
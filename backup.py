@@ -0,0 +1,276 @@
+import os
+import sys
+import gzip
+import json
+import asyncio
+import hashlib
+import logging
+from contextlib import closing
+from datetime import datetime
+from itertools import groupby
+from async_storage import cancel_task
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backup")
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", 900))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", 96))
+# طول زنجیره delta وقتی BACKUP_KEEP=0 (نگه‌داشتن همه نسخه‌ها)
+MAX_CHAIN = 96
+
+
+class BackupStore:
+    # objects/: محتوای فشرده با نام هش (بدون تکرار)، manifests/: فهرست هر snapshot.
+    # هر manifest فقط تغییرات نسبت به parent خودش را دارد و زنجیره از یک manifest کامل (base) شروع می‌شود.
+    # index.db تعداد ارجاع هر object، نسخه کاربران در آخرین snapshot و فهرست manifestها را نگه می‌دارد
+    # تا snapshot و retention مجبور به خواندن همه manifestها نباشند.
+    def __init__(self, root=BACKUP_DIR):
+        self.root = root
+        self.objects = os.path.join(root, "objects")
+        self.manifests = os.path.join(root, "manifests")
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.manifests, exist_ok=True)
+
+    def _index(self):
+        # sqlite3 فقط در thread بکاپ بارگذاری می‌شود، نه هنگام import ربات
+        import sqlite3
+        conn = sqlite3.connect(os.path.join(self.root, "index.db"))
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS refs (digest TEXT PRIMARY KEY, count INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS versions (user_id TEXT PRIMARY KEY, version INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS manifests (name TEXT PRIMARY KEY, base TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        return closing(conn)
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects, digest[:2], digest + ".gz")
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(gzip.compress(data, mtime=0))
+            os.replace(tmp, path)
+        return digest
+
+    def get(self, digest):
+        with open(self._object_path(digest), "rb") as f:
+            return gzip.decompress(f.read())
+
+    def list_manifests(self):
+        return sorted(n[:-len(".json.gz")] for n in os.listdir(self.manifests) if n.endswith(".json.gz"))
+
+    def load_manifest(self, name):
+        with open(os.path.join(self.manifests, name + ".json.gz"), "rb") as f:
+            return json.loads(gzip.decompress(f.read()))
+
+    def save_manifest(self, name, manifest):
+        path = os.path.join(self.manifests, name + ".json.gz")
+        with open(path + ".tmp", "wb") as f:
+            f.write(gzip.compress(json.dumps(manifest).encode("utf-8")))
+        os.replace(path + ".tmp", path)
+
+    def chain(self, name):
+        # manifestهای base تا name به ترتیب؛ manifestهای قالب قدیمی (بدون parent) کامل هستند
+        chain = [self.load_manifest(name)]
+        while chain[-1].get("parent"):
+            chain.append(self.load_manifest(chain[-1]["parent"]))
+        return chain[::-1]
+
+    def state(self):
+        # (آخرین manifest، نسخه کاربران، آخرین ذهن‌نوشته، نام base زنجیره فعلی، طول زنجیره)
+        names = self.list_manifests()
+        with self._index() as conn:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+        if meta.get("head") != (names[-1] if names else None):
+            # index قدیمی یا ناقص (ارتقا از قالب قبلی یا قطع شدن وسط snapshot)
+            self.rebuild()
+            with self._index() as conn:
+                meta = dict(conn.execute("SELECT key, value FROM meta"))
+        with self._index() as conn:
+            versions = dict(conn.execute("SELECT user_id, version FROM versions"))
+            length = conn.execute("SELECT COUNT(*) FROM manifests WHERE base = ?", (meta.get("base"),)).fetchone()[0]
+        return meta.get("head"), versions, int(meta.get("thoughts_last_id", 0)), meta.get("base"), length
+
+    def rebuild(self):
+        refs, manifests, users, last_id, base = {}, [], {}, 0, None
+        for name in self.list_manifests():
+            m = self.load_manifest(name)
+            if not m.get("parent"):
+                base, users = name, {}
+            users.update(m["users"])
+            last_id = m["thoughts_last_id"]
+            manifests.append((name, base))
+            for digest in manifest_objects(m):
+                refs[digest] = refs.get(digest, 0) + 1
+        with self._index() as conn, conn:
+            conn.execute("DELETE FROM refs")
+            conn.execute("DELETE FROM versions")
+            conn.execute("DELETE FROM manifests")
+            conn.execute("DELETE FROM meta")
+            conn.executemany("INSERT INTO refs (digest, count) VALUES (?, ?)", refs.items())
+            conn.executemany("INSERT INTO versions (user_id, version) VALUES (?, ?)",
+                             [(uid, e["version"]) for uid, e in users.items()])
+            conn.executemany("INSERT INTO manifests (name, base) VALUES (?, ?)", manifests)
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                             [("head", manifests[-1][0] if manifests else None), ("base", base),
+                              ("thoughts_last_id", last_id)])
+        # objectهایی که هیچ manifestی به آنها ارجاع نمی‌دهد (مثلاً از snapshot نیمه‌تمام)
+        for sub in os.listdir(self.objects):
+            for filename in os.listdir(os.path.join(self.objects, sub)):
+                if filename.endswith(".gz") and filename[:-3] not in refs:
+                    os.remove(os.path.join(self.objects, sub, filename))
+
+    def add(self, name, manifest, versions, base):
+        # index پیش از نوشتن manifest به‌روز می‌شود؛ اگر وسط کار قطع شود head با فایل‌ها نمی‌خواند و rebuild می‌شود
+        with self._index() as conn, conn:
+            conn.executemany("INSERT INTO refs (digest, count) VALUES (?, 1) "
+                             "ON CONFLICT (digest) DO UPDATE SET count = count + 1", [(d,) for d in manifest_objects(manifest)])
+            conn.executemany("INSERT OR REPLACE INTO versions (user_id, version) VALUES (?, ?)", versions.items())
+            conn.execute("INSERT INTO manifests (name, base) VALUES (?, ?)", (name, base))
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                             [("head", name), ("base", base), ("thoughts_last_id", manifest["thoughts_last_id"])])
+        self.save_manifest(name, manifest)
+
+    def apply_retention(self, keep):
+        # زنجیره‌ها کامل حذف می‌شوند، آن هم فقط وقتی زنجیره‌های جدیدتر دست‌کم keep نسخه داشته باشند
+        if not keep:
+            return 0
+        with self._index() as conn:
+            chains = [list(names) for _, names in groupby(
+                conn.execute("SELECT name, base FROM manifests ORDER BY name"), key=lambda r: r[1])]
+        total = sum(len(c) for c in chains)
+        removed = 0
+        while len(chains) > 1 and total - len(chains[0]) >= keep:
+            chain = chains.pop(0)
+            total -= len(chain)
+            dropped = []
+            # از آخر به اول تا هیچ delta بدون parent باقی نماند
+            for name, _ in reversed(chain):
+                dropped += manifest_objects(self.load_manifest(name))
+                os.remove(os.path.join(self.manifests, name + ".json.gz"))
+            with self._index() as conn, conn:
+                conn.executemany("UPDATE refs SET count = count - 1 WHERE digest = ?", [(d,) for d in dropped])
+                conn.executemany("DELETE FROM manifests WHERE name = ?", [(name,) for name, _ in chain])
+                dead = [r[0] for r in conn.execute("SELECT digest FROM refs WHERE count <= 0")]
+                conn.execute("DELETE FROM refs WHERE count <= 0")
+            for digest in dead:
+                try:
+                    os.remove(self._object_path(digest))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+def manifest_objects(manifest):
+    yield from (u["hash"] for u in manifest["users"].values())
+    for chain in manifest["thoughts"].values():
+        yield from chain
+
+
+def resolve(chain):
+    users, thoughts = {}, {}
+    for m in chain:
+        users.update(m["users"])
+        for uid, digests in m["thoughts"].items():
+            thoughts.setdefault(uid, []).extend(digests)
+    return users, thoughts
+
+
+def snapshot(storage, store, keep=BACKUP_KEEP):
+    head, versions, last_id, base, length = store.state()
+    changed = {}
+    for uid, version in list(storage.user_versions()):
+        if versions.get(str(uid)) == version:
+            continue
+        data = storage.get_user(uid)
+        if data is None:
+            continue
+        digest = store.put(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        changed[str(uid)] = {"version": version, "hash": digest}
+    # ذهن‌نوشته‌ها فقط اضافه می‌شوند، پس برای هر کاربر فقط دلتای جدید ذخیره و به زنجیره‌اش اضافه می‌شود
+    thoughts = {}
+    new_last_id = last_id
+    for uid, rows in groupby(storage.thoughts_since(last_id), key=lambda r: r[1]):
+        lines = []
+        for tid, _, ts, text in rows:
+            lines.append(json.dumps({"ts": ts, "text": text}, ensure_ascii=False))
+            new_last_id = max(new_last_id, tid)
+        thoughts.setdefault(str(uid), []).append(store.put(("\n".join(lines) + "\n").encode("utf-8")))
+    if not changed and new_last_id == last_id and head:
+        return None
+    name = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+    manifest = {"created": name, "parent": head, "users": changed, "thoughts": thoughts, "thoughts_last_id": new_last_id}
+    if head is None or length >= (keep or MAX_CHAIN):
+        # base جدید: وضعیت کامل از زنجیره قبلی (فقط هش‌ها) به‌علاوه تغییرات این دور
+        users, chains = resolve(store.chain(head)) if head else ({}, {})
+        users.update(changed)
+        for uid, digests in thoughts.items():
+            chains.setdefault(uid, []).extend(digests)
+        manifest.update(parent=None, users=users, thoughts=chains)
+        base = name
+    store.add(name, manifest, {uid: e["version"] for uid, e in changed.items()}, base)
+    store.apply_retention(keep)
+    logging.info(f"💾 بکاپ {name}: {len(changed)} کاربر تغییرکرده، ذهن‌نوشته‌ها تا #{new_last_id}")
+    return name
+
+
+def restore(store, name, storage):
+    users, thoughts = resolve(store.chain(name))
+    for uid, entry in users.items():
+        data = json.loads(store.get(entry["hash"]))
+        storage.add_user(uid, data["joined"])
+        storage.write_batch([(uid, d, slot, score) for d, slots in data["moods"].items() for slot, score in slots.items()], [])
+    for uid, chain in thoughts.items():
+        storage.add_user(uid)
+        for digest in chain:
+            rows = [json.loads(line) for line in store.get(digest).decode("utf-8").splitlines() if line]
+            storage.write_batch([], [(uid, r["ts"], r["text"]) for r in rows])
+    return len(users)
+
+
+class BackupService:
+    def __init__(self, storage, store=None, interval=BACKUP_INTERVAL, keep=BACKUP_KEEP):
+        self.storage = storage
+        self.store = store or BackupStore()
+        self.interval = interval
+        self.keep = keep
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        await cancel_task(self._task)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # thread جدا تا thread pool ورودی/خروجی هندلرها اشغال نشود
+                await asyncio.to_thread(snapshot, self.storage, self.store, self.keep)
+            except Exception as e:
+                logging.exception(f"🚨 بکاپ ناموفق: {e}")
+
+
+if __name__ == "__main__":
+    from storage import open_storage
+    logging.basicConfig(level=logging.INFO)
+    store = BackupStore()
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "snapshot":
+        print(snapshot(open_storage(os.getenv("DB_PATH", "moods.db")), store) or "no changes")
+    elif cmd == "list":
+        print("\n".join(store.list_manifests()))
+    elif cmd == "restore" and len(sys.argv) == 4:
+        if os.path.exists(sys.argv[3]):
+            print(f"{sys.argv[3]} already exists; restore into a new database file")
+            sys.exit(1)
+        print(f"restored {restore(store, sys.argv[2], open_storage(sys.argv[3]))} users")
+    else:
+        print("usage: python backup.py snapshot | list | restore <manifest> <new_db_path>")
+        sys.exit(1)
@@ -0,0 +1,107 @@
+# زمان پاسخ آمار ادمین روی MoodCube بزرگ؛ مکعب مستقیم با NumPy پر می‌شود تا ساخت اولیه از SQLite در زمان حساب نشود.
+# ساخت اولیه (اولین «📈 آمار کلی» بعد از ری‌استارت) جدا روی یک دیتابیس SQLite با --db-users کاربر سنجیده می‌شود.
+#   python bench/analytics.py [--users 100000] [--days 365] [--changed 1000] [--db-users 2000]
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import date, timedelta
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import MoodCube
+from storage import SQLiteStorage
+
+SLOTS = ["صبح", "ظهر", "عصر", "شب", "قبل خواب"]
+
+
+class ChangedUsers:
+    # شبیه storage: همه کاربران با version ثابت، به جز changed تا که version جدید و یک نمره امروز دارند
+    def __init__(self, cube, changed, today):
+        self.cube = cube
+        self.changed = set(int(u) for u in cube.user_ids[:changed])
+        self.today = today.isoformat()
+
+    def iter_users(self):
+        for uid in self.cube.user_ids[:self.cube.n].tolist():
+            yield uid, "2025-01-01", self.cube.versions[uid] + (uid in self.changed)
+
+    def iter_moods_since(self, since, user_ids=None):
+        for uid in user_ids or self.changed:
+            yield uid, self.today, SLOTS[0], 7
+
+
+def timed(label, func, *args, **kwargs):
+    t = time.perf_counter()
+    result = func(*args, **kwargs)
+    print(f"{label:>18}: {(time.perf_counter() - t) * 1000:8.1f} ms")
+    return result
+
+
+def build_from_sqlite(args, rng, today):
+    # فقط جدول‌های users و moods که refresh می‌خواند پر می‌شوند؛ aggregates برای این سنجش لازم نیست
+    path = os.path.join(tempfile.mkdtemp(), "analytics.db")
+    storage = SQLiteStorage(path, fsync="off")
+    start = today.toordinal() - args.days + 1
+    rows = 0
+    with storage._conn() as conn:
+        conn.executemany("INSERT INTO users (user_id, joined) VALUES (?, ?)",
+                         [(uid, date.fromordinal(start).isoformat()) for uid in range(1, args.db_users + 1)])
+        for uid in range(1, args.db_users + 1):
+            filled = rng.random((args.days, len(SLOTS))) >= 0.4
+            scores = rng.integers(1, 11, (args.days, len(SLOTS)))
+            batch = [(uid, date.fromordinal(start + d).isoformat(), SLOTS[s], int(scores[d, s]))
+                     for d, s in zip(*np.nonzero(filled))]
+            conn.executemany("INSERT INTO moods (user_id, date, slot, score) VALUES (?, ?, ?, ?)", batch)
+            rows += len(batch)
+    print(f"{args.db_users} users x {args.days} days in SQLite: {rows} moods, "
+          f"{os.path.getsize(path) / 2 ** 20:.0f} MB")
+    cube = MoodCube(SLOTS, days=args.days)
+    t = time.perf_counter()
+    loaded = cube.refresh(storage, today)
+    wall = time.perf_counter() - t
+    print(f"{'initial build':>18}: {wall * 1000:8.1f} ms ({loaded} users, {rows / wall / 1e6:.2f} M moods/s)")
+    timed("refresh (no-op)", cube.refresh, storage, today)
+    storage.close()
+
+
+def main(args):
+    rng = np.random.default_rng(1)
+    today = date.today()
+    cube = MoodCube(SLOTS, days=args.days)
+    cube.end = today.toordinal()
+    cube._grow(args.users)
+    cube.n = args.users
+    cube.user_ids[:args.users] = np.arange(1, args.users + 1)
+    cube.joined[:args.users] = today.toordinal() - rng.integers(0, args.days, args.users)
+    cube.rows = {uid: uid - 1 for uid in range(1, args.users + 1)}
+    cube.versions = {uid: 1 for uid in range(1, args.users + 1)}
+    for i in range(len(SLOTS)):
+        block = rng.integers(0, 11, (args.users, args.days), dtype=np.int8)
+        block[rng.random((args.users, args.days)) < 0.4] = 0
+        cube.scores[i, :args.users] = block
+    print(f"{args.users} users x {args.days} days: {cube.scores.nbytes / 2 ** 20:.0f} MB")
+    timed("initial accounting", cube._account, np.arange(args.users), 1)
+
+    storage = ChangedUsers(cube, args.changed, today)
+    timed(f"refresh {args.changed}", cube.refresh, storage, today)
+    timed("refresh (no-op)", cube.refresh, storage, today)
+    timed("daily_active", cube.daily_active, 30)
+    timed("slot_distribution", cube.slot_distribution)
+    timed("retention", cube.retention)
+    timed("retention (cache)", cube.retention)
+    timed("at_risk", cube.at_risk)
+    timed("day rollover", cube.refresh, storage, today + timedelta(days=1))
+    if args.db_users:
+        build_from_sqlite(args, rng, today)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--changed", type=int, default=1000)
+    parser.add_argument("--db-users", type=int, default=2000)
+    main(parser.parse_args())
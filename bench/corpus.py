@@ -0,0 +1,60 @@
+# پوشه‌های userdata/ و thoughts/ ساختگی با همان فرمت فایل‌های قدیمی ربات، برای migrate_files و بنچمارک‌ها
+#   python bench/corpus.py OUT_DIR [--users 500] [--days 60] [--heavy-users 20] [--heavy-days 730] [--thoughts 5]
+import os
+import json
+import random
+import argparse
+from datetime import date, datetime, timedelta
+
+SLOTS = ["صبح", "ظهر", "عصر", "شب", "قبل خواب"]
+WORDS = "امروز خسته بودم ولی حالم بهتره کار زیاد بود خواب کم دلم گرفته خوشحالم دوست قدم زدم".split()
+
+
+def user_days(uid, args):
+    return args.heavy_days if uid <= args.heavy_users else args.days
+
+
+def generate(out, args):
+    rng = random.Random(args.seed)
+    data_folder = os.path.join(out, "userdata")
+    thoughts_folder = os.path.join(out, "thoughts")
+    os.makedirs(data_folder, exist_ok=True)
+    os.makedirs(thoughts_folder, exist_ok=True)
+    today = date.today()
+    moods = 0
+    for uid in range(1, args.users + 1):
+        days = user_days(uid, args)
+        start = today - timedelta(days=days)
+        # حدود ۱۰٪ نوبت‌ها خالی می‌مانند تا داده شبیه واقعیت باشد
+        user_moods = {}
+        for d in range(days):
+            slots = {slot: rng.randint(1, 10) for slot in SLOTS if rng.random() > 0.1}
+            if slots:
+                user_moods[(start + timedelta(days=d)).isoformat()] = slots
+                moods += len(slots)
+        with open(os.path.join(data_folder, f"{uid}.json"), "w", encoding="utf-8") as f:
+            json.dump({"joined": start.isoformat(), "moods": user_moods}, f, ensure_ascii=False)
+        with open(os.path.join(thoughts_folder, f"{uid}.txt"), "w", encoding="utf-8") as f:
+            for _ in range(args.thoughts):
+                ts = datetime.combine(start + timedelta(days=rng.randrange(days)), datetime.min.time())
+                ts += timedelta(seconds=rng.randrange(86400))
+                f.write(f"[{ts}] {' '.join(rng.choices(WORDS, k=rng.randint(3, 40)))}\n")
+    return data_folder, thoughts_folder, moods
+
+
+def add_arguments(parser):
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--heavy-users", type=int, default=20, help="کاربرانی با تاریخچه طولانی برای گزارش‌ها")
+    parser.add_argument("--heavy-days", type=int, default=730)
+    parser.add_argument("--thoughts", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("out")
+    add_arguments(parser)
+    args = parser.parse_args()
+    _, _, moods = generate(args.out, args)
+    print(f"{args.users} users, {moods} moods -> {args.out}")
@@ -0,0 +1,189 @@
+# Bot API جعلی روی HttpServer خود ربات: هر متد یک پاسخ موفق ساختگی برمی‌گرداند و تعداد فراخوانی‌ها شمرده می‌شود
+# در پردازه جدا اجرا می‌شود تا CPU آن در اندازه‌گیری ربات حساب نشود:
+#   python bench/fake_api.py --port 8081 [--token 123456:bench]   # GET /stats تعداد فراخوانی هر متد
+# خطای ساختگی برای تست پایداری: POST /faults?fail_rate=0.5&latency_ms=200&hang=1&retry_after_rate=0.1
+#   fail_rate: سهم پاسخ‌های 502، hang: پاسخ ندادن تا timeout کلاینت، retry_after_rate: سهم پاسخ‌های 429
+# GET /delivered تعداد پیام‌های متنی که واقعاً به هر chat_id رسیده‌اند
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import socket
+import argparse
+import itertools
+import subprocess
+import urllib.request
+from collections import Counter
+from urllib.parse import parse_qs, urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from server import HttpServer
+
+BOT_INFO = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot",
+            "can_join_groups": False, "can_read_all_group_messages": False, "supports_inline_queries": False}
+MESSAGE_METHODS = ("sendMessage", "sendPhoto", "sendDocument", "editMessageText")
+TRUE_METHODS = ("answerCallbackQuery", "deleteWebhook", "setWebhook", "setMyCommands")
+FAULTS = {"fail_rate": 0.0, "latency_ms": 0.0, "hang": 0.0, "retry_after_rate": 0.0}
+HANG_SECONDS = 3600
+POLL_SECONDS = 0.5
+
+
+class FakeBotAPI:
+    def __init__(self, token, host="127.0.0.1", port=0):
+        self.token = token
+        self.server = HttpServer(host, port)
+        self.calls = Counter()
+        self.delivered = Counter()
+        self.faults = dict(FAULTS)
+        self._message_ids = itertools.count(1)
+        self.server.route("POST", self._path("getMe"), self._respond("getMe", lambda params: BOT_INFO))
+        for method in MESSAGE_METHODS:
+            self.server.route("POST", self._path(method), self._respond(method, self._message))
+        for method in TRUE_METHODS:
+            self.server.route("POST", self._path(method), self._respond(method, lambda params: True))
+        self.server.route("POST", self._path("getUpdates"), self._get_updates)
+        self.server.route("GET", "/stats", self._stats)
+        self.server.route("GET", "/delivered", self._delivered)
+        self.server.route("POST", "/faults", self._set_faults)
+
+    def _path(self, method):
+        return f"/bot{self.token}/{method}"
+
+    @property
+    def base_url(self):
+        return f"http://{self.server.host}:{self.port}/bot"
+
+    @property
+    def port(self):
+        return self.server._server.sockets[0].getsockname()[1]
+
+    def _message(self, params):
+        chat_id = int(params.get("chat_id", 0))
+        return {"message_id": next(self._message_ids), "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", "")}
+
+    def _respond(self, method, result):
+        async def handle(request):
+            self.calls[method] += 1
+            fault = await self._inject()
+            if fault is not None:
+                self.calls["faults"] += 1
+                return fault
+            # sendPhoto/sendDocument به صورت multipart می‌آیند؛ برای پاسخ ساختگی فیلدهای فرم لازم نیست
+            params = {}
+            if request.headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+                params = {k: v[0] for k, v in parse_qs(request.body.decode()).items()}
+            body = json.dumps({"ok": True, "result": result(params)}).encode()
+            if method == "sendMessage":
+                self.delivered[params.get("chat_id")] += 1
+            return 200, "application/json", body
+        return handle
+
+    async def _get_updates(self, request):
+        # long-poll بدون آپدیت؛ کوتاه نگه داشته می‌شود تا توقف ربات در بنچمارک معطل نماند
+        self.calls["getUpdates"] += 1
+        fault = await self._inject()
+        if fault is not None:
+            self.calls["faults"] += 1
+            return fault
+        await asyncio.sleep(POLL_SECONDS)
+        return 200, "application/json", b'{"ok": true, "result": []}'
+
+    async def _inject(self):
+        faults = self.faults
+        if faults["latency_ms"]:
+            await asyncio.sleep(faults["latency_ms"] / 1000)
+        if faults["hang"]:
+            await asyncio.sleep(HANG_SECONDS)
+        if random.random() < faults["fail_rate"]:
+            # مثل قطعی پشت load balancer تلگرام: صفحه HTML به جای JSON
+            return 502, "text/html", b"<html><body><h1>502 Bad Gateway</h1></body></html>"
+        if random.random() < faults["retry_after_rate"]:
+            body = {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1}}
+            return 429, "application/json", json.dumps(body).encode()
+        return None
+
+    async def _set_faults(self, request):
+        for key, values in parse_qs(request.query).items():
+            if key not in FAULTS:
+                return 400, "text/plain", f"unknown fault {key}".encode()
+            self.faults[key] = float(values[0])
+        return 200, "application/json", json.dumps(self.faults).encode()
+
+    async def _delivered(self, request):
+        return 200, "application/json", json.dumps(self.delivered).encode()
+
+    async def _stats(self, request):
+        return 200, "application/json", json.dumps(self.calls).encode()
+
+    async def start(self):
+        await self.server.start()
+
+    async def stop(self):
+        await self.server.stop()
+
+
+class FakeBotAPIProcess:
+    def __init__(self, token, host="127.0.0.1"):
+        self.token = token
+        self.host = host
+        self.port = None
+        self._proc = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/bot"
+
+    def start(self, timeout=10):
+        with socket.socket() as sock:
+            sock.bind((self.host, 0))
+            self.port = sock.getsockname()[1]
+        self._proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--port", str(self.port),
+                                       "--token", self.token], stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.calls()
+            except OSError:
+                if time.monotonic() > deadline or self._proc.poll() is not None:
+                    raise RuntimeError("fake Bot API did not start")
+                time.sleep(0.05)
+
+    def _get(self, path, method="GET"):
+        request = urllib.request.Request(f"http://{self.host}:{self.port}{path}", method=method)
+        with urllib.request.urlopen(request, timeout=5) as resp:
+            return json.load(resp)
+
+    def calls(self):
+        return Counter(self._get("/stats"))
+
+    def delivered(self):
+        return Counter(self._get("/delivered"))
+
+    def set_faults(self, **faults):
+        # مقدارهای داده‌نشده صفر می‌شوند تا هر سناریو از حالت سالم شروع کند
+        query = urlencode(dict(FAULTS, **faults))
+        return self._get(f"/faults?{query}", method="POST")
+
+    def stop(self):
+        if self._proc is not None:
+            self._proc.terminate()
+            self._proc.wait()
+            self._proc = None
+
+
+async def serve(token, port):
+    api = FakeBotAPI(token, port=port)
+    await api.start()
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--token", default="123456:bench")
+    args = parser.parse_args()
+    asyncio.run(serve(args.token, args.port))
@@ -0,0 +1,123 @@
+# بار ناگهانی روی handle_all: تأخیر event loop (lag) نباید با بزرگ شدن burst بالا برود
+#   python bench/handler_latency.py [--bursts 1,50,500] [--users 2000] [--days 60]
+# تضمین: p99 هندلر حداکثر حدود REPORT_WAIT است (نمودارهایی که دیرتر آماده شوند جدا ارسال می‌شوند)؛
+# ستون chart p99 زمان رسیدن نمودار است که با اندازه burst و CHART_WORKERS بالا می‌رود
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from types import SimpleNamespace
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeMessage:
+    def __init__(self, text, bot):
+        self.text = text
+        self.bot = bot
+
+    async def reply_text(self, *args, **kwargs):
+        pass
+
+    async def reply_photo(self, *args, **kwargs):
+        await self.bot.send_photo()
+
+
+class FakeBot:
+    def __init__(self, arrived, charts):
+        self.arrived = arrived
+        self.charts = charts
+
+    async def send_message(self, *args, **kwargs):
+        pass
+
+    async def send_photo(self, *args, **kwargs):
+        self.charts.append((time.perf_counter() - self.arrived) * 1000)
+
+
+def make_update(user_id, text, bot):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id, first_name="bench"),
+                           effective_chat=SimpleNamespace(id=user_id), message=FakeMessage(text, bot))
+
+
+def seed(storage, users, days):
+    slots = ["صبح", "ظهر", "عصر", "شب", "قبل خواب"]
+    start = date.today() - timedelta(days=days)
+    conn = storage._conn()
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO users (user_id, joined) VALUES (?, ?)",
+                         [(uid, start.isoformat()) for uid in range(1, users + 1)])
+        conn.executemany("INSERT OR REPLACE INTO moods (user_id, date, slot, score) VALUES (?, ?, ?, ?)",
+                         [(uid, (start + timedelta(days=d)).isoformat(), slot, random.randint(1, 10))
+                          for uid in range(1, users + 1) for d in range(days) for slot in slots])
+    storage.rebuild_aggregates()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0
+
+
+async def timed(bot, update, context, arrived, out):
+    await bot.handle_all(update, context)
+    out.append((time.perf_counter() - arrived) * 1000)
+
+
+async def sample_lag(out, stop):
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(0.001)
+        out.append((time.perf_counter() - t - 0.001) * 1000)
+
+
+async def run_burst(bot, size, users):
+    heavy, lag, charts = [], [], []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_lag(lag, stop))
+    await asyncio.sleep(0.01)
+    tasks = []
+    arrived = time.perf_counter()
+    context = SimpleNamespace(bot=FakeBot(arrived, charts))
+    for i in range(size):
+        uid = random.randint(1, users)
+        if i % 2:
+            tasks.append(timed(bot, make_update(uid, "وضعیت هفته", context.bot), context, arrived, heavy))
+        else:
+            bot.sessions.set(uid, bot.TYPING_THOUGHT)
+            tasks.append(timed(bot, make_update(uid, f"bench {i}", context.bot), context, arrived, heavy))
+    await asyncio.gather(*tasks)
+    # نمودارهایی که بعد از پیام «در حال ساخت» ارسال می‌شوند
+    await asyncio.gather(*list(bot.report_deliveries.values()))
+    wall = time.perf_counter() - arrived
+    stop.set()
+    await sampler
+    return wall, heavy, lag, charts
+
+
+async def main(args):
+    import mood_tracker_bot as bot
+    bot.init_services()
+    seed(bot.storage.sync, args.users, args.days)
+    bot.writer.start()
+    print(f"{'burst':>6} {'wall(s)':>8} {'lag p50':>8} {'lag p99':>8} {'lag max':>8} {'p50':>8} {'p99':>8} {'chart p99':>10}")
+    for size in args.bursts:
+        wall, heavy, lag, charts = await run_burst(bot, size, args.users)
+        print(f"{size:>6} {wall:>8.2f} {percentile(lag, 50):>8.2f} {percentile(lag, 99):>8.2f} {max(lag):>8.2f} "
+              f"{percentile(heavy, 50):>8.2f} {percentile(heavy, 99):>8.2f} {percentile(charts, 99):>10.2f}")
+    await bot.writer.close()
+    bot.shutdown_io()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bursts", type=lambda s: [int(x) for x in s.split(",")], default=[1, 50, 500])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=60)
+    args = parser.parse_args()
+    tmp = tempfile.mkdtemp()
+    os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+    asyncio.run(main(args))
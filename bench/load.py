@@ -0,0 +1,278 @@
+# شبیه‌سازی بار روی کل مسیر ربات (PTB → هندلرها → storage → Bot API جعلی روی localhost)
+#   python bench/load.py [--scenarios start,mood,thought,report,broadcast] [--count 500] [--users 500] ...
+#   python bench/load.py --compare bench/results/<commit>.json   # مقایسه با اجرای قبلی، خروج با کد ۱ در صورت پسرفت
+# نتیجه هر اجرا در bench/results/<commit>.json ذخیره می‌شود؛ برای مقایسه باید پارامترها یکسان باشند.
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import resource
+import itertools
+import subprocess
+import tempfile
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_api import FakeBotAPIProcess
+import corpus
+
+TOKEN = "123456:bench"
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+ADMIN_ID = 10 ** 9
+IDS = itertools.count(1)
+
+
+def user(uid):
+    return {"id": uid, "is_bot": False, "first_name": "bench"}
+
+
+def message_update(uid, text):
+    msg = {"message_id": next(IDS), "date": int(time.time()), "chat": {"id": uid, "type": "private"},
+           "from": user(uid), "text": text}
+    if text.startswith("/"):
+        msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": next(IDS), "message": msg}
+
+
+def callback_update(uid, data):
+    msg = {"message_id": next(IDS), "date": int(time.time()), "chat": {"id": uid, "type": "private"}, "text": "⏰"}
+    return {"update_id": next(IDS), "callback_query": {"id": str(next(IDS)), "from": user(uid),
+                                                        "chat_instance": "bench", "data": data, "message": msg}}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+async def drive(app, conversations, concurrency):
+    # هر conversation دنباله آپدیت‌های یک کاربر است و به ترتیب پردازش می‌شود؛ تأخیر هر آپدیت جدا ثبت می‌شود
+    from telegram import Update
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def run(updates):
+        async with gate:
+            for data in updates:
+                update = Update.de_json(data, app.bot)
+                t = time.perf_counter()
+                await app.process_update(update)
+                latencies.append((time.perf_counter() - t) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(c) for c in conversations))
+    return time.perf_counter() - started, latencies
+
+
+def scenario_start(bot, args, rng, rep):
+    first = args.users + 1 + rep * args.count
+    return [[message_update(uid, "/start")] for uid in range(first, first + args.count)]
+
+
+def scenario_mood(bot, args, rng, rep):
+    today = date.today().isoformat()
+    return [[callback_update(rng.randint(1, args.users),
+                             f"mood:{today}:{rng.randrange(len(bot.TIME_SLOTS))}:{rng.randint(1, 10)}")]
+            for _ in range(args.count)]
+
+
+def scenario_thought(bot, args, rng, rep):
+    return [[message_update(uid, "🧠 خالی کردن ذهن"),
+             message_update(uid, " ".join(rng.choices(corpus.WORDS, k=rng.randint(5, 200))))]
+            for uid in (rng.randint(1, args.users) for _ in range(args.count))]
+
+
+def scenario_report(bot, args, rng, rep):
+    heavy = max(1, min(args.heavy_users, args.users))
+    return [[message_update(rng.randint(1, heavy), rng.choice(["وضعیت هفته", "وضعیت ماه"]))]
+            for _ in range(args.count)]
+
+
+async def run_broadcast(bot, app, api, args, rng, rep):
+    # ارسال در پس‌زمینه انجام می‌شود؛ زمان کل تا پایان job و نرخ ارسال به کاربران اندازه‌گیری می‌شود
+    await bot.ADMIN_PANEL.add(ADMIN_ID)
+    bot.sessions.set(ADMIN_ID, bot.TYPING_BROADCAST)
+    sent_before = (await asyncio.to_thread(api.calls))["sendMessage"]
+    started = time.perf_counter()
+    _, latencies = await drive(app, [[message_update(ADMIN_ID, "bench broadcast")]], 1)
+    await asyncio.gather(*list(bot.broadcasts.jobs.values()))
+    wall = time.perf_counter() - started
+    await bot.ADMIN_PANEL.discard(ADMIN_ID)
+    return wall, latencies, (await asyncio.to_thread(api.calls))["sendMessage"] - sent_before
+
+
+SCENARIOS = {"start": scenario_start, "mood": scenario_mood, "thought": scenario_thought,
+             "report": scenario_report, "broadcast": run_broadcast}
+
+
+def summarize(runs):
+    # نرخ، میانه تکرارها است و درصدها روی تأخیرهای همه تکرارها حساب می‌شوند تا نویز اجرای تکی کم شود
+    runs = sorted(runs, key=lambda r: r[0] / r[1] if r[1] else 0)
+    count, wall, _, cpu = runs[len(runs) // 2]
+    latencies = [x for r in runs for x in r[2]]
+    # زمان CPU پردازه (همه threadها) به ازای هر عملیات روی ماشین شلوغ پایدارتر از زمان دیواری است
+    return {"count": count, "wall_s": round(wall, 3), "throughput": round(count / wall, 1) if wall else 0,
+            "cpu_ms": round(cpu / count * 1000, 3) if count else 0,
+            "p50_ms": round(percentile(latencies, 50), 2), "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2), "max_ms": round(max(latencies, default=0), 2),
+            "rss_mb": round(rss_mb(), 1), "peak_rss_mb": round(peak_rss_mb(), 1)}
+
+
+async def run(args, tmp, api):
+    import mood_tracker_bot as bot
+    from storage import migrate_files
+    bot.init_services()
+
+    results = {}
+    data_folder, thoughts_folder, moods = corpus.generate(tmp, args)
+    started = time.perf_counter()
+    migrate_files(bot.storage.sync, data_folder, thoughts_folder, force=True)
+    wall = time.perf_counter() - started
+    results["migrate"] = {"count": moods, "wall_s": round(wall, 3), "throughput": round(moods / wall, 1),
+                          "rss_mb": round(rss_mb(), 1), "peak_rss_mb": round(peak_rss_mb(), 1)}
+
+    app = bot.build_app()
+    rng = random.Random(args.seed)
+    async with app:
+        bot.registry.load(await bot.storage.user_ids())
+        bot.writer.start()
+        for name in args.scenarios:
+            runs = []
+            # اجراهای warmup (شروع pool نمودار، اتصال‌های HTTP) در نتیجه حساب نمی‌شوند
+            for rep in range(args.warmup + args.repeat):
+                cpu = time.process_time()
+                if name == "broadcast":
+                    wall, latencies, count = await run_broadcast(bot, app, api, args, rng, rep)
+                else:
+                    wall, latencies = await drive(app, SCENARIOS[name](bot, args, rng, rep), args.concurrency)
+                    count = len(latencies)
+                if rep >= args.warmup:
+                    runs.append((count, wall, latencies, time.process_time() - cpu))
+            results[name] = summarize(runs)
+        await bot.writer.close()
+    bot.charts.shutdown()
+    bot.shutdown_io()
+    return results
+
+
+def git_commit():
+    try:
+        sha = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return sha, dirty
+
+
+def print_table(results, baseline=None):
+    cols = ["count", "throughput", "cpu_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms", "rss_mb"]
+    print(f"{'scenario':>10} " + " ".join(f"{c:>11}" for c in cols))
+    for name, row in results.items():
+        cells = []
+        for c in cols:
+            value = row.get(c, "")
+            old = (baseline or {}).get(name, {}).get(c)
+            if old and isinstance(value, (int, float)) and c != "count":
+                cells.append(f"{value:>7}{(value - old) / old * 100:+4.0f}%")
+            else:
+                cells.append(f"{value:>11}")
+        print(f"{name:>10} " + " ".join(cells))
+
+
+def regressions(results, baseline, threshold):
+    found = []
+    for name, row in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        if old.get("throughput") and row["throughput"] < old["throughput"] * (1 - threshold):
+            found.append(f"{name}: throughput {old['throughput']} -> {row['throughput']}")
+        if old.get("cpu_ms") and row["cpu_ms"] > old["cpu_ms"] * (1 + threshold):
+            found.append(f"{name}: cpu/op {old['cpu_ms']}ms -> {row['cpu_ms']}ms")
+        if old.get("p95_ms") and row.get("p95_ms", 0) > old["p95_ms"] * (1 + threshold):
+            found.append(f"{name}: p95 {old['p95_ms']}ms -> {row['p95_ms']}ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=list(SCENARIOS))
+    parser.add_argument("--count", type=int, default=500, help="تعداد مکالمه در هر سناریو")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--real-limits", action="store_true", help="محدودیت نرخ ارسال واقعی تلگرام را نگه دار")
+    parser.add_argument("--out", help="مسیر فایل نتیجه (پیش‌فرض bench/results/<commit>.json)")
+    parser.add_argument("--compare", help="فایل نتیجه قبلی برای مقایسه")
+    parser.add_argument("--threshold", type=float, default=0.2, help="حد پسرفت مجاز (۰.۲ یعنی ۲۰٪)")
+    corpus.add_arguments(parser)
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update({"BOT_TOKEN": TOKEN, "DB_PATH": os.path.join(tmp, "bench.db"), "PERSIST_SESSIONS": "0",
+                       "WORKERS": "1"})
+    if not args.real_limits:
+        # سقف ۳۰ پیام در ثانیه تلگرام زمان broadcast را تعیین می‌کند، نه کد ربات؛
+        # سهم هر کاربر هم برداشته می‌شود چون سناریوها با تعداد کمی کاربر پر تکرار اجرا می‌شوند
+        os.environ.update({"GLOBAL_SEND_RATE": "1000000", "CHAT_SEND_RATE": "1000000",
+                           "USER_RATE": "1000000", "USER_BURST": "1000000"})
+    api = FakeBotAPIProcess(TOKEN)
+    api.start()
+    os.environ["BOT_API_URL"] = api.base_url
+    try:
+        results = asyncio.run(run(args, tmp, api))
+    finally:
+        api.stop()
+
+    params = {k: v for k, v in vars(args).items() if k not in ("out", "compare", "threshold")}
+    sha, dirty = git_commit()
+    report = {"commit": sha, "dirty": dirty, "python": platform.python_version(), "machine": platform.machine(),
+              "cpus": os.cpu_count(), "params": params, "results": results}
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        if old["params"] != params:
+            print("⚠️ پارامترهای اجرای قبلی متفاوت است؛ مقایسه معتبر نیست.")
+        baseline = old["results"]
+        print(f"baseline: {old['commit']}{' (dirty)' if old['dirty'] else ''}")
+    print(f"commit: {sha}{' (dirty)' if dirty else ''}")
+    print_table(results, baseline)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{sha}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"-> {out}")
+
+    if baseline:
+        found = regressions(results, baseline, args.threshold)
+        for line in found:
+            print(f"❌ {line}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# ساخت شبانه گزارش‌ها: زمان اجرای ReportPregenerator روی پیکره ساختگی و تأخیر «وضعیت هفته/ماه»
+# بدون گزارش آماده (رندر هنگام درخواست) در مقایسه با بعد از ساخت شبانه
+#   python bench/pregen.py [--users 150] [--days 45] [--requests 150]
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_api import FakeBotAPIProcess
+from load import TOKEN, drive, message_update, percentile
+import corpus
+
+
+def report_requests(args, rng):
+    return [[message_update(rng.randint(1, args.users), rng.choice(["وضعیت هفته", "وضعیت ماه"]))]
+            for _ in range(args.requests)]
+
+
+def summary(label, wall, latencies):
+    print(f"{label:>18}: {len(latencies) / wall:7.1f} req/s, p50 {percentile(latencies, 50):7.1f} ms, "
+          f"p95 {percentile(latencies, 95):7.1f} ms")
+
+
+async def run(args, tmp):
+    import mood_tracker_bot as bot
+    from storage import migrate_files
+    bot.init_services()
+    data_folder, thoughts_folder, _ = corpus.generate(tmp, args)
+    migrate_files(bot.storage.sync, data_folder, thoughts_folder, force=True)
+    app = bot.build_app()
+    async with app:
+        bot.registry.load(await bot.storage.user_ids())
+        bot.writer.start()
+        rng = random.Random(args.seed)
+        summary("on demand", *await drive(app, report_requests(args, rng), args.concurrency))
+
+        # کش حافظه خالی می‌شود تا فقط گزارش‌های ذخیره‌شده روی دیسک سنجیده شوند
+        bot.charts._cache.clear()
+        # پیکره تا امروز نمره دارد؛ اجرای ساعت فعلی همه کاربران فعال را پوشش می‌دهد
+        started = time.perf_counter()
+        built = await bot.pregen.run_once(datetime.now())
+        wall = time.perf_counter() - started
+        size = sum(e.stat().st_size for e in os.scandir(bot.report_cache.folder))
+        print(f"{'pregen':>18}: {built} charts ({size / 2 ** 20:.1f} MB) in {wall:.1f} s (duty {bot.pregen.duty})")
+        summary("pregenerated", *await drive(app, report_requests(args, rng), args.concurrency))
+        await bot.pregen.stop()
+        await bot.writer.close()
+    bot.charts.shutdown()
+    bot.shutdown_io()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=150)
+    parser.add_argument("--concurrency", type=int, default=64)
+    corpus.add_arguments(parser)
+    parser.set_defaults(users=150, days=45)
+    args = parser.parse_args()
+    tmp = tempfile.mkdtemp()
+    os.environ.update({"BOT_TOKEN": TOKEN, "DB_PATH": os.path.join(tmp, "bench.db"), "PERSIST_SESSIONS": "0",
+                       "REPORTS_DIR": os.path.join(tmp, "reports"),
+                       "WORKERS": "1", "GLOBAL_SEND_RATE": "1000000", "CHAT_SEND_RATE": "1000000",
+                       "USER_RATE": "1000000", "USER_BURST": "1000000", "PREGEN_MAX_LOAD": "1000"})
+    api = FakeBotAPIProcess(TOKEN)
+    api.start()
+    os.environ["BOT_API_URL"] = api.base_url
+    try:
+        asyncio.run(run(args, tmp))
+    finally:
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# پایداری کلاینت تلگرام در برابر قطعی: API جعلی خطا تزریق می‌کند و بررسی می‌شود که
+#   ۱) در قطعی کامل هندلرها معطل نمی‌مانند و پیام‌ها در outbox ذخیره می‌شوند،
+#   ۲) بعد از وصل شدن دوباره همه پیام‌ها دقیقاً به همه کاربران می‌رسند،
+#   ۳) با خطای پراکنده (502 و 429) هیچ پیامی گم نمی‌شود،
+#   ۴) اگر Bot API هنگام راه‌اندازی در دسترس نباشد، supervise ربات را با backoff دوباره بالا می‌آورد.
+#   python bench/resilience.py [--users 200] [--flaky-rate 0.3] [--outage-s 3]
+# در صورت شکست هر بررسی، خروج با کد ۱ است.
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_api import FakeBotAPIProcess
+from load import TOKEN, drive, message_update, percentile
+
+
+async def wait_for(predicate, timeout, interval=0.1):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if await predicate():
+            return True
+        await asyncio.sleep(interval)
+    return False
+
+
+async def outbox_empty(bot):
+    return not bot.storage.sync.outbox_due(time.time() + 3600, 1)
+
+
+async def phase(bot, app, api, name, users, faults):
+    await asyncio.to_thread(api.set_faults, **faults)
+    before = await asyncio.to_thread(api.delivered)
+    wall, latencies = await drive(app, [[message_update(uid, "/start")] for uid in users], 64)
+    await asyncio.to_thread(api.set_faults)
+    started = time.perf_counter()
+    drained = await wait_for(lambda: outbox_empty(bot), 60)
+    recovery = time.perf_counter() - started
+    delivered = await asyncio.to_thread(api.delivered) - before
+    missing = [uid for uid in users if delivered[str(uid)] < 1]
+    duplicated = sum(1 for uid in users if delivered[str(uid)] > 1)
+    print(f"{name:>8}: p95 handler {percentile(latencies, 95):7.1f} ms, max {max(latencies):7.1f} ms, "
+          f"drain {recovery:5.2f} s, missing {len(missing)}, duplicated {duplicated}")
+    problems = []
+    if not drained:
+        problems.append(f"{name}: outbox not drained")
+    if missing:
+        problems.append(f"{name}: {len(missing)} users got no message")
+    return problems
+
+
+async def check_delivery(args):
+    import mood_tracker_bot as bot
+    bot.init_services()
+    api = args.api
+    app = bot.build_app()
+    problems = []
+    async with app:
+        bot.registry.load(await bot.storage.user_ids())
+        bot.writer.start()
+        bot.outbox.start(app.bot)
+        users = iter(range(1, 4 * args.users + 1))
+        take = lambda: [next(users) for _ in range(args.users)]
+        problems += await phase(bot, app, api, "healthy", take(), {})
+        problems += await phase(bot, app, api, "outage", take(), {"fail_rate": 1})
+        problems += await phase(bot, app, api, "flaky", take(), {"fail_rate": args.flaky_rate})
+        problems += await phase(bot, app, api, "429", take(), {"retry_after_rate": args.flaky_rate})
+        await bot.outbox.stop()
+        await bot.writer.close()
+    return problems
+
+
+async def check_supervisor(args):
+    import mood_tracker_bot as bot
+    from server import HttpServer
+    from resilience import supervise
+    api = args.api
+    stop = asyncio.Event()
+    await asyncio.to_thread(api.set_faults, fail_rate=1)
+    calls = await asyncio.to_thread(api.calls)
+    task = asyncio.create_task(supervise(lambda: bot.serve(HttpServer("127.0.0.1", 0), stop, False), stop))
+    await asyncio.sleep(args.outage_s)
+    await asyncio.to_thread(api.set_faults)
+    failed = (await asyncio.to_thread(api.calls))["getMe"] - calls["getMe"]
+    started = time.perf_counter()
+
+    async def polling():
+        return (await asyncio.to_thread(api.calls))["getUpdates"] > calls["getUpdates"]
+
+    recovered = await wait_for(polling, 30)
+    recovery = time.perf_counter() - started
+    stop.set()
+    await asyncio.wait_for(task, 30)
+    print(f"supervise: {failed} failed startups in {args.outage_s:.0f} s, polling again after {recovery:.2f} s")
+    problems = [] if recovered else ["supervise: bot did not recover after outage"]
+    if failed < 2:
+        problems.append("supervise: bot was not restarted during outage")
+    return problems
+
+
+async def run(args):
+    import mood_tracker_bot as bot
+    problems = await check_delivery(args)
+    problems += await check_supervisor(args)
+    bot.charts.shutdown()
+    bot.shutdown_io()
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200, help="تعداد کاربر در هر مرحله")
+    parser.add_argument("--flaky-rate", type=float, default=0.3)
+    parser.add_argument("--outage-s", type=float, default=3)
+    args = parser.parse_args()
+    tmp = tempfile.mkdtemp()
+    # breaker و outbox و supervise با زمان‌های کوتاه تا بنچمارک در چند ثانیه تمام شود
+    os.environ.update({"BOT_TOKEN": TOKEN, "DB_PATH": os.path.join(tmp, "bench.db"), "PERSIST_SESSIONS": "0",
+                       "BACKUP_DIR": os.path.join(tmp, "backup"), "WORKERS": "1", "GLOBAL_SEND_RATE": "1000000", "CHAT_SEND_RATE": "1000000",
+                       "BREAKER_RESET": "0.5", "OUTBOX_INTERVAL": "0.1", "RESTART_BASE": "0.2", "RESTART_CAP": "1"})
+    args.api = FakeBotAPIProcess(TOKEN)
+    args.api.start()
+    os.environ["BOT_API_URL"] = args.api.base_url
+    try:
+        problems = asyncio.run(run(args))
+    finally:
+        args.api.stop()
+    for problem in problems:
+        print(f"❌ {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
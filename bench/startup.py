@@ -0,0 +1,122 @@
+# بودجه زمان راه‌اندازی: import بدون اثر جانبی و آماده شدن ربات (تا app.start) زیر یک ثانیه
+#   python bench/startup.py [--import-budget-ms 700] [--ready-budget-ms 1000] [--top 10]
+# اگر هر بودجه‌ای رد شود یا import ماژول سنگین/اثر جانبی داشته باشد، خروج با کد ۱ است.
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_api import FakeBotAPIProcess
+
+TOKEN = "123456:bench"
+# این‌ها فقط باید هنگام نیاز بارگذاری شوند (نمودار، آمار ادمین، دیتابیس، چند پردازه‌ای)
+LAZY_MODULES = ("matplotlib", "numpy", "sqlite3", "storage", "analytics", "workers")
+
+IMPORT_PROBE = f"""
+import sys
+sys.path.insert(0, {ROOT!r})
+import mood_tracker_bot
+print(",".join(m for m in {LAZY_MODULES!r} if m in sys.modules))
+"""
+
+READY_PROBE = f"""
+import sys, asyncio
+sys.path.insert(0, {ROOT!r})
+import mood_tracker_bot as bot
+
+async def main():
+    app = bot.build_app()
+    async with app:
+        await bot.post_init(app)
+        await app.start()
+        print("READY", flush=True)
+        await app.stop()
+        await bot.post_shutdown(app)
+    bot.charts.shutdown()
+    bot.shutdown_io()
+
+asyncio.run(main())
+"""
+
+
+def parse_importtime(stderr):
+    # «import time: self | cumulative | name»؛ تورفتگی name عمق import را نشان می‌دهد
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative), name))
+    return rows
+
+
+def check_import(env, cwd, args):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", IMPORT_PROBE], env=env, cwd=cwd,
+                          capture_output=True, text=True)
+    if proc.returncode:
+        print(proc.stderr[-2000:])
+        return ["import failed"]
+    rows = parse_importtime(proc.stderr)
+    total = next(c for _, c, name in rows if name.strip() == "mood_tracker_bot") / 1000
+    # فقط importهای مستقیم خود ماژول (یک سطح تورفتگی زیر آن)
+    top = sorted((r for r in rows if len(r[2]) - len(r[2].lstrip()) == 3), key=lambda r: -r[1])[:args.top]
+    print(f"import mood_tracker_bot: {total:.0f} ms (budget {args.import_budget_ms} ms)")
+    for _, cumulative, name in top:
+        print(f"  {cumulative / 1000:8.1f} ms  {name.strip()}")
+    problems = []
+    if total > args.import_budget_ms:
+        problems.append(f"import took {total:.0f} ms")
+    loaded = [m for m in proc.stdout.strip().split(",") if m]
+    if loaded:
+        problems.append(f"eagerly imported: {', '.join(loaded)}")
+    created = os.listdir(cwd)
+    if created:
+        problems.append(f"import created files: {', '.join(created)}")
+    return problems
+
+
+def check_ready(env, cwd, args):
+    api = FakeBotAPIProcess(TOKEN)
+    api.start()
+    env = dict(env, BOT_API_URL=api.base_url)
+    try:
+        started = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "-c", READY_PROBE], env=env, cwd=cwd,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        line = proc.stdout.readline()
+        ready = (time.perf_counter() - started) * 1000
+        _, stderr = proc.communicate()
+    finally:
+        api.stop()
+    if not line.startswith("READY"):
+        print(stderr[-2000:])
+        return ["bot did not start"]
+    print(f"process start -> app.start(): {ready:.0f} ms (budget {args.ready_budget_ms} ms)")
+    return [f"ready after {ready:.0f} ms"] if ready > args.ready_budget_ms else []
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--import-budget-ms", type=float, default=700)
+    parser.add_argument("--ready-budget-ms", type=float, default=1000)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    tmp = tempfile.mkdtemp()
+    cwd = os.path.join(tmp, "cwd")
+    os.mkdir(cwd)
+    env = dict(os.environ, BOT_TOKEN=TOKEN, DB_PATH=os.path.join(tmp, "bench.db"),
+               BACKUP_DIR=os.path.join(tmp, "backup"), PERSIST_SESSIONS="0", WORKERS="1")
+    problems = check_import(env, cwd, args)
+    problems += check_ready(env, cwd, args)
+    for problem in problems:
+        print(f"❌ {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
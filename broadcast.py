@@ -0,0 +1,149 @@
+import os
+import time
+import asyncio
+import logging
+import itertools
+from telegram.error import RetryAfter, Forbidden, BadRequest, NetworkError, TelegramError
+from async_storage import run_io, cancel_task
+from shared import LocalSharedState, worker_id, LEASE_TTL
+from resilience import Deferred, PACED, backoff
+
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 20))
+PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", 5))
+SEND_ATTEMPTS = 5
+
+
+async def send_with_retry(bot, limiter, chat_id, text, **kwargs):
+    for attempt in range(SEND_ATTEMPTS):
+        await limiter.acquire(chat_id)
+        try:
+            # 429 را همین‌جا با مکث SendLimiter مدیریت می‌کنیم؛ فقط قطعی شبکه به outbox می‌رود
+            await bot.send_message(chat_id, text, rate_limit_args=PACED, **kwargs)
+            return True
+        except Deferred:
+            # قطعی شبکه یا breaker باز؛ پیام در outbox ذخیره شده و بعداً ارسال می‌شود
+            return True
+        except RetryAfter as e:
+            logging.warning(f"⏳ محدودیت تلگرام، {e.retry_after} ثانیه صبر می‌کنیم.")
+            limiter.retry_after(e.retry_after)
+        except (Forbidden, BadRequest) as e:
+            # کاربر ربات را بلاک کرده یا چت وجود ندارد؛ تلاش دوباره فایده‌ای ندارد
+            logging.info(f"✖️ ارسال به {chat_id} ناموفق: {e}")
+            return False
+        except NetworkError as e:
+            logging.warning(f"🌐 خطای شبکه در ارسال به {chat_id}: {e}")
+            await asyncio.sleep(backoff(attempt))
+        except TelegramError as e:
+            logging.error(f"❌ خطا در ارسال به {chat_id}: {e}")
+            return False
+    return False
+
+
+class BroadcastEngine:
+    def __init__(self, storage, limiter, concurrency=BROADCAST_CONCURRENCY, progress_interval=PROGRESS_INTERVAL,
+                 shared=None, owner=None):
+        self.storage = storage
+        self.limiter = limiter
+        # هر job یک lease دارد تا بعد از ری‌استارت فقط یک پردازه آن را ادامه دهد
+        self.shared = shared or LocalSharedState()
+        self.owner = owner or worker_id()
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self.jobs = {}
+        self._watcher = None
+        self._tokens = itertools.count()
+
+    async def start(self, bot, admin_id, text, targets, fail=0, spawn=True):
+        # spawn=False: فقط ذخیره می‌شود و بررسی دوره‌ای رهبر (watch) ارسال را شروع می‌کند
+        job_id = await self.storage.create_broadcast(admin_id, text, targets, fail)
+        if spawn:
+            job = {"id": job_id, "admin_id": admin_id, "text": text, "targets": list(targets),
+                   "cursor": 0, "success": 0, "fail": fail}
+            self._spawn(bot, job)
+        return job_id
+
+    async def resume(self, bot):
+        # jobهای running که در این پردازه اجرا نمی‌شوند؛ اگر lease شان آزاد باشد (پردازه قبلی مرده) ادامه پیدا می‌کنند
+        for job in await self.storage.pending_broadcasts():
+            if job["id"] not in self.jobs:
+                self._spawn(bot, job, resumed=True)
+
+    def watch(self, bot, interval=LEASE_TTL):
+        # روی رهبر: jobهای worker مرده یا jobی که هنگام انتخاب رهبر lease اش هنوز معتبر بود، با بررسی دوره‌ای برداشته می‌شوند
+        self._watcher = asyncio.create_task(self._watch(bot, interval))
+
+    async def _watch(self, bot, interval):
+        while True:
+            try:
+                await self.resume(bot)
+            except Exception as e:
+                logging.warning(f"🔁 بررسی پیام‌های همگانی نیمه‌تمام ناموفق: {e}")
+            await asyncio.sleep(interval)
+
+    async def stop_watch(self):
+        await cancel_task(self._watcher)
+        self._watcher = None
+
+    def _spawn(self, bot, job, resumed=False):
+        # watch ممکن است job را بین create_broadcast و _spawn در start برداشته باشد
+        if job["id"] in self.jobs:
+            return
+        task = asyncio.create_task(self._run_logged(bot, job, resumed))
+        self.jobs[job["id"]] = task
+
+        def done(t):
+            if self.jobs.get(job["id"]) is t:
+                del self.jobs[job["id"]]
+        task.add_done_callback(done)
+
+    def _progress_text(self, job):
+        return (f"📤 پیام همگانی #{job['id']}: {job['cursor']}/{len(job['targets'])}\n"
+                f"✅ {job['success']}  ❌ {job['fail']}")
+
+    async def _report(self, bot, job, message_id):
+        try:
+            await bot.edit_message_text(self._progress_text(job), chat_id=job["admin_id"], message_id=message_id)
+        except TelegramError as e:
+            logging.debug(f"progress update skipped: {e}")
+
+    async def _run_logged(self, bot, job, resumed=False):
+        lease = f"broadcast:{job['id']}"
+        # lease برای یک owner تکرارپذیر است؛ هر task توکن خودش را دارد تا دو task در یک پردازه یک job را نفرستند
+        owner = f"{self.owner}/{next(self._tokens)}"
+        if not await run_io(self.shared.acquire, lease, owner, LEASE_TTL):
+            # بررسی دوره‌ای رهبر بعد از انقضای lease دوباره امتحان می‌کند
+            logging.debug(f"⏭ پیام همگانی #{job['id']} در پردازه دیگری در حال اجراست.")
+            return
+        if resumed:
+            logging.info(f"🔁 ادامه پیام همگانی #{job['id']} از {job['cursor']}/{len(job['targets'])}")
+        try:
+            await self._run(bot, job, lease, owner)
+        except Exception as e:
+            # وضعیت در دیتابیس running می‌ماند تا در اجرای بعدی ادامه پیدا کند
+            logging.exception(f"🚨 پیام همگانی #{job['id']} متوقف شد: {e}")
+        finally:
+            await run_io(self.shared.release, lease, owner)
+
+    async def _run(self, bot, job, lease, owner):
+        targets = job["targets"]
+        progress = await bot.send_message(job["admin_id"], self._progress_text(job))
+        last_report = time.monotonic()
+        # ارسال در دسته‌های هم‌اندازه با concurrency؛ cursor فقط بعد از تمام شدن هر دسته جلو می‌رود
+        # تا بعد از ری‌استارت، حداکثر یک دسته دوباره ارسال شود
+        while job["cursor"] < len(targets):
+            chunk = targets[job["cursor"]:job["cursor"] + self.concurrency]
+            results = await asyncio.gather(*(send_with_retry(bot, self.limiter, uid, job["text"]) for uid in chunk))
+            ok = sum(results)
+            job["success"] += ok
+            job["fail"] += len(results) - ok
+            job["cursor"] += len(chunk)
+            await self.storage.update_broadcast(job["id"], job["cursor"], job["success"], job["fail"])
+            if not await run_io(self.shared.acquire, lease, owner, LEASE_TTL):
+                logging.warning(f"🗳 lease پیام همگانی #{job['id']} از دست رفت؛ ارسال متوقف شد.")
+                return
+            if time.monotonic() - last_report >= self.progress_interval:
+                last_report = time.monotonic()
+                await self._report(bot, job, progress.message_id)
+        await self.storage.update_broadcast(job["id"], job["cursor"], job["success"], job["fail"], "done")
+        await self._report(bot, job, progress.message_id)
+        await bot.send_message(job["admin_id"], f"✅ پیام برای {job['success']} نفر ارسال شد.\n❌ شکست‌خورده: {job['fail']}")
@@ -0,0 +1,89 @@
+import os
+import asyncio
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from metrics import CHART_RENDER, CHART_CACHE, timed
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", 2))
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", 2048))
+
+
+def render_mood_chart(dates, scores, title):
+    # فقط API شیءگرای Figure/Agg؛ pyplot و وضعیت سراسری‌اش اینجا استفاده نمی‌شود
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(10, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(dates, scores, marker='o')
+    ax.set_title(title)
+    ax.tick_params(axis="x", labelrotation=45)
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+class ChartService:
+    def __init__(self, workers=CHART_WORKERS, cache_size=CHART_CACHE_SIZE, nice=0):
+        self.workers = workers
+        self.cache_size = cache_size
+        # nice > 0: پردازه‌های رندر اولویت پایین‌تری از ربات و رندرهای درخواستی کاربر دارند
+        self.nice = nice
+        self._pool = None
+        # user_id -> (version, png)؛ نسخه جدید داده، ورودی قبلی را باطل می‌کند
+        self._cache = OrderedDict()
+        # (user_id, version) -> رندر در حال اجرا؛ ضربه‌های تکراری منتظر همان رندر می‌مانند
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=os.nice if self.nice else None,
+                                             initargs=(self.nice,) if self.nice else ())
+        return self._pool
+
+    def get_cached(self, user_id, version):
+        entry = self._cache.get(user_id)
+        if entry is None or entry[0] != version:
+            return None
+        self._cache.move_to_end(user_id)
+        self.hits += 1
+        CHART_CACHE.inc(result="hit")
+        return entry[1]
+
+    def put(self, user_id, version, png):
+        self._cache[user_id] = (version, png)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def render(self, user_id, version, dates, scores, title):
+        png = self.get_cached(user_id, version)
+        if png is not None:
+            return png
+        self.misses += 1
+        CHART_CACHE.inc(result="miss")
+        png = await self.render_png(dates, scores, title)
+        self.put(user_id, version, png)
+        return png
+
+    def render_task(self, user_id, version, dates, scores, title):
+        key = (user_id, version)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self.render(user_id, version, dates, scores, title))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def render_png(self, dates, scores, title):
+        loop = asyncio.get_running_loop()
+        with timed(CHART_RENDER):
+            return await loop.run_in_executor(self._executor(), render_mood_chart, dates, scores, title)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
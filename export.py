@@ -0,0 +1,71 @@
+import io
+import os
+import csv
+import json
+import zipfile
+import tempfile
+
+EXPORT_FORMATS = ("csv", "jsonl")
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+# سقف فایل ارسالی ربات‌ها در تلگرام ۵۰ مگابایت است؛ حاشیه برای آخرین کاربر هر بخش و central directory
+EXPORT_PART_SIZE = int(os.getenv("EXPORT_PART_SIZE", 45 * 1024 * 1024))
+
+
+def iter_records(storage, user_id):
+    for date, slot, score in storage.iter_moods(user_id):
+        yield {"type": "mood", "date": date, "slot": slot, "score": score}
+    for ts, text in storage.iter_thoughts(user_id):
+        yield {"type": "thought", "ts": ts, "text": text}
+
+
+def write_records(records, binary, fmt):
+    out = io.TextIOWrapper(binary, encoding="utf-8", newline="")
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(["type", "date", "slot", "score", "ts", "text"])
+        for r in records:
+            writer.writerow([r["type"], r.get("date", ""), r.get("slot", ""), r.get("score", ""),
+                             r.get("ts", ""), r.get("text", "")])
+    else:
+        for r in records:
+            out.write(json.dumps(r, ensure_ascii=False) + "\n")
+    out.flush()
+    out.detach()
+
+
+def export_user(storage, user_id, fmt="csv"):
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    write_records(iter_records(storage, user_id), spool, fmt)
+    spool.seek(0)
+    return spool
+
+
+def export_all(storage, user_ids, fmt="csv", part_size=EXPORT_PART_SIZE):
+    # هر کاربر مستقیم داخل zip نوشته می‌شود؛ کل داده هیچ‌وقت با هم در حافظه نیست.
+    # وقتی zip از part_size بگذرد بسته می‌شود و کاربران بعدی در zip جدید می‌روند
+    parts = []
+    spool = zf = None
+    try:
+        for uid in user_ids:
+            if zf is None:
+                spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+                zf = zipfile.ZipFile(spool, "w", compression=zipfile.ZIP_DEFLATED)
+            with zf.open(f"{uid}.{fmt}", "w") as entry:
+                write_records(iter_records(storage, uid), entry, fmt)
+            if spool.tell() >= part_size:
+                zf.close()
+                spool.seek(0)
+                parts.append(spool)
+                zf = None
+        if zf is None and not parts:
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            zf = zipfile.ZipFile(spool, "w", compression=zipfile.ZIP_DEFLATED)
+        if zf is not None:
+            zf.close()
+            spool.seek(0)
+            parts.append(spool)
+    except BaseException:
+        for part in parts + ([spool] if spool is not None and spool not in parts else []):
+            part.close()
+        raise
+    return parts
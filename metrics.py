@@ -0,0 +1,151 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+
+_metrics = []
+
+
+def _label_str(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        _metrics.append(self)
+
+    def inc(self, value=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, _label_str(self.labels, key), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self.values[tuple(labels.get(n, "") for n in self.labels)] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * len(self.buckets), 0, 0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+        entry[1] += 1
+        entry[2] += value
+
+    def samples(self):
+        for key, (counts, count, total) in self.values.items():
+            for bound, c in zip(self.buckets, counts):
+                yield f"{self.name}_bucket", _label_str(self.labels + ("le",), key + (bound,)), c
+            yield f"{self.name}_bucket", _label_str(self.labels + ("le",), key + ("+Inf",)), count
+            yield f"{self.name}_count", _label_str(self.labels, key), count
+            yield f"{self.name}_sum", _label_str(self.labels, key), total
+
+
+@contextmanager
+def timed(histogram, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+def render():
+    lines = []
+    for m in _metrics:
+        lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        for name, labels, value in m.samples():
+            lines.append(f"{name}{labels} {value}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+HANDLER_LATENCY = Histogram("bot_handler_seconds", "Handler latency", ["handler"])
+STORAGE_LATENCY = Histogram("bot_storage_seconds", "Storage call latency", ["op"])
+CHART_RENDER = Histogram("bot_chart_render_seconds", "Chart render time", buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10))
+CHART_CACHE = Counter("bot_chart_cache_total", "Chart cache lookups", ["result"])
+SENDS = Counter("bot_send_total", "Outbound Bot API request results", ["method", "result"])
+LOOP_LAG = Gauge("bot_event_loop_lag_seconds", "Last measured event loop lag")
+LOOP_LAG_HIST = Histogram("bot_event_loop_lag_hist_seconds", "Event loop lag", buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1))
+BREAKER_STATE = Gauge("bot_circuit_breaker_state", "Outbound circuit breaker (0 closed, 1 open, 2 half-open)")
+OUTBOX = Counter("bot_outbox_total", "Outbox messages", ["result"])
+THROTTLED = Counter("bot_throttled_total", "Updates dropped by per-user rate limiting", ["action"])
+COALESCED = Counter("bot_coalesced_total", "Duplicate in-flight updates dropped")
+PREGEN = Counter("bot_report_pregen_total", "Report charts pre-generated in the nightly batch")
+STARTUP = Gauge("bot_startup_seconds", "Seconds from module import to accepting updates")
+
+
+async def monitor_loop_lag(interval=0.5):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - start - interval)
+        LOOP_LAG.set(lag)
+        LOOP_LAG_HIST.observe(lag)
+
+
+def sample_stacks(seconds, interval=0.005):
+    # خروجی با فرمت collapsed stacks، مستقیم قابل استفاده در flamegraph.pl یا speedscope
+    tally = _Tally()
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            tally[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in tally.most_common())
+
+
+async def metrics_endpoint(request):
+    return 200, "text/plain; version=0.0.4", render()
+
+
+async def profile_endpoint(request):
+    params = dict(p.partition("=")[::2] for p in request.query.split("&") if p)
+    if not PROFILER_TOKEN or params.get("token") != PROFILER_TOKEN:
+        return 403, "text/plain", b"forbidden"
+    seconds = min(float(params.get("seconds", 10)), 60)
+    stacks = await asyncio.to_thread(sample_stacks, seconds)
+    return 200, "text/plain", stacks.encode("utf-8")
@@ -1,34 +1,71 @@
+import time
+
+_started = time.perf_counter()
+
 import logging
-import asyncio
-import nest_asyncio
-nest_asyncio.apply()
 import os
 import json
+import sys
 import asyncio
-import threading
-import time
-from http.server import BaseHTTPRequestHandler, HTTPServer
-from datetime import datetime
-import matplotlib.pyplot as plt
-from telegram import Update, ReplyKeyboardMarkup
+import secrets
+import signal
+from datetime import datetime, timedelta
+from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
-    ApplicationBuilder, CommandHandler, MessageHandler,
+    ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler,
     ContextTypes, filters
 )
-from telegram.error import TimedOut, NetworkError
+from telegram.error import NetworkError, TelegramError
+from async_storage import AsyncStorage, run_io, shutdown_io
+from charts import ChartService
+from ratelimit import SendLimiter, UserThrottle, GLOBAL_SEND_RATE
+from broadcast import BroadcastEngine
+from registry import UserRegistry
+from reminders import ReminderScheduler, parse_mood_callback
+import aggregates
+from export import export_user, export_all, EXPORT_FORMATS
+from writebehind import WriteBehind
+from backup import BackupService
+from server import HttpServer, UserOrderedUpdateProcessor, health, webhook_handler
+from metrics import monitor_loop_lag, metrics_endpoint, profile_endpoint, STARTUP, CHART_CACHE, THROTTLED
+from router import Router
+from sessions import SessionStore
+from shared import LocalSharedState, SQLiteSharedState, LeaderElector, worker_id
+from resilience import CircuitBreaker, Outbox, ResilientRequests, Deferred, supervise
+from pregen import ReportPregenerator, ReportCache, REPORTS, CHART_TITLE, chart_series
 
 TOKEN = os.getenv("BOT_TOKEN")
+BOT_API_URL = os.getenv("BOT_API_URL")  # سرور Bot API محلی یا API جعلی بنچمارک
 ADMIN_PASSWORD = os.getenv("ADMIN_PASS", "admin1234")
 ADMIN_MAIN_ID = 7066529596
+PORT = int(os.environ.get("PORT", 10000))  # استفاده از PORT دینامیک مخصوص Render
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = "/telegram"
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_hex(16)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 64))
+# حداکثر انتظار هندلر گزارش برای رندر؛ بعد از آن پیام «در حال ساخت» می‌رود و نمودار جدا ارسال می‌شود
+REPORT_WAIT = float(os.getenv("REPORT_WAIT", 1))
+WORKERS = int(os.getenv("WORKERS", 1))
+# polling و ارسال هر کدام pool اتصال جدا دارند تا long-poll هیچ‌وقت جای ارسال پیام را نگیرد
+SEND_POOL_SIZE = int(os.getenv("SEND_POOL_SIZE", UPDATE_CONCURRENCY))
+POLL_TIMEOUT = int(os.getenv("POLL_TIMEOUT", 30))
+CONNECT_TIMEOUT = float(os.getenv("CONNECT_TIMEOUT", 5))
+SHARD, SHARDS = 0, 1
 
 DATA_FOLDER = "userdata"
 THOUGHTS_FOLDER = "thoughts"
-os.makedirs(DATA_FOLDER, exist_ok=True)
-os.makedirs(THOUGHTS_FOLDER, exist_ok=True)
+DB_PATH = os.getenv("DB_PATH", "moods.db")
+FSYNC_POLICY = os.getenv("FSYNC_POLICY", "normal")
+registry = UserRegistry()
 
 TIME_SLOTS = ["صبح", "ظهر", "عصر", "شب", "قبل خواب"]
 TIME_REMINDERS = {"صبح": 8, "ظهر": 13, "عصر": 17, "شب": 21, "قبل خواب": 23}
-reply_keyboard = [["وضعیت هفته", "وضعیت ماه", "🧠 خالی کردن ذهن"]]
+
+# سرویس‌ها در init_services ساخته می‌شوند؛ import این ماژول (تست، ابزار، worker) نه دیتابیس باز می‌کند نه فایل و thread می‌سازد
+storage = writer = backups = charts = send_limiter = shared = elector = broadcasts = reminders = None
+breaker = outbox = pregen = report_cache = None
+mood_cube = None
+reply_keyboard = [["وضعیت هفته", "وضعیت ماه", "🧠 خالی کردن ذهن"], ["📓 هیستوری ذهن"]]
 markup = ReplyKeyboardMarkup(reply_keyboard, one_time_keyboard=True, resize_keyboard=True)
 
 TYPING_THOUGHT = 1
@@ -38,24 +75,68 @@ TYPING_EXPORT_ID = 4
 TYPING_SUMMARY_ID = 5
 TYPING_PRIVATE_IDS = 6
 TYPING_PRIVATE_MESSAGE = 7
+TYPING_SEARCH = 8
+BROWSING_SEARCH = 9
 
-ADMIN_PANEL = set()
-user_states = {}
-broadcast_targets = []
+THOUGHTS_PAGE_SIZE = 5
+USERS_PAGE_SIZE = 50
+THOUGHT_PREVIEW = 400
+HISTORY_RANGES = {"a": ("📓 هیستوری ذهن", None), "w": ("📓 ۷ روز اخیر", 7), "m": ("📓 ۳۰ روز اخیر", 30)}
+REPORT_TEXTS = {title for title, _ in REPORTS.values()}
+
+PERSIST_SESSIONS = os.getenv("PERSIST_SESSIONS", "1") == "1"
+ADMIN_PANEL = None
+sessions = SessionStore()
+# (user_id, version) -> ارسال نمودارهایی که بعد از پیام «در حال ساخت» فرستاده می‌شوند
+report_deliveries = {}
+router = Router()
+throttle = UserThrottle()
+# پیشوند callback_data -> نام کار در جدول هزینه‌ها
+CALLBACK_ACTIONS = {"mood": "mood", "users": "users_list", "thoughts": "history", "tsearch": "search"}
+
+def init_services(db_path=None):
+    global storage, writer, backups, charts, send_limiter, shared, elector, broadcasts, reminders, ADMIN_PANEL
+    global breaker, outbox, pregen, report_cache
+    if storage is not None:
+        return
+    from storage import open_storage
+    storage = AsyncStorage(open_storage(db_path or DB_PATH, fsync=FSYNC_POLICY))
+    writer = WriteBehind(storage.sync)
+    backups = BackupService(storage.sync)
+    charts = ChartService()
+    # ارسال‌های انبوه (یادآور، broadcast، outbox) فقط روی رهبر است و رهبر کل سقف سراسری را می‌گیرد؛
+    # بقیه worker ها فقط سهم خودشان را برای jobهایی که پیش از عزل شروع کرده‌اند دارند
+    send_limiter = SendLimiter(global_rate=GLOBAL_SEND_RATE / WORKERS)
+    shared = SQLiteSharedState(storage.sync) if WORKERS > 1 else LocalSharedState()
+    elector = LeaderElector(shared, "leader", worker_id())
+    broadcasts = BroadcastEngine(storage, send_limiter, shared=shared, owner=elector.owner)
+    reminders = ReminderScheduler(storage, registry, send_limiter, TIME_REMINDERS, reload=WORKERS > 1)
+    breaker = CircuitBreaker()
+    outbox = Outbox(storage.sync, breaker)
+    # گزارش‌ها بعد از آخرین نوبت روز («قبل خواب») از پیش ساخته می‌شوند
+    report_cache = ReportCache()
+    pregen = ReportPregenerator(storage, TIME_REMINDERS[TIME_SLOTS[-1]], report_cache)
+    ADMIN_PANEL = shared.admins
+
+def get_mood_cube():
+    # NumPy فقط با اولین درخواست آمار ادمین بارگذاری می‌شود
+    global mood_cube
+    if mood_cube is None:
+        from analytics import MoodCube
+        mood_cube = MoodCube(TIME_SLOTS)
+    return mood_cube
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = str(update.effective_user.id)
-    if not os.path.exists(os.path.join(DATA_FOLDER, f"{user_id}.json")):
-        with open(os.path.join(DATA_FOLDER, f"{user_id}.json"), "w", encoding="utf-8") as f:
-            json.dump({"joined": datetime.now().isoformat(), "moods": {}}, f)
+    if registry.add(update.effective_user.id):
+        await storage.add_user(update.effective_user.id)
     await update.message.reply_text("سلام! منتظر نوتیف در ساعت‌های مشخص باش و در آن زمان نمره‌ات را وارد کن.", reply_markup=markup)
 
 async def admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id == ADMIN_MAIN_ID:
-        ADMIN_PANEL.add(update.effective_user.id)
+        await ADMIN_PANEL.add(update.effective_user.id)
         await show_admin_menu(update)
     else:
-        user_states[update.effective_user.id] = WAITING_FOR_PASSWORD
+        sessions.set(update.effective_user.id, WAITING_FOR_PASSWORD)
         await update.message.reply_text("🔐 لطفاً رمز پنل ادمین را وارد کنید:")
 
 async def allow(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -63,205 +144,575 @@ async def allow(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     try:
         uid = int(context.args[0])
-        ADMIN_PANEL.add(uid)
+        await ADMIN_PANEL.add(uid)
         await context.bot.send_message(uid, "✅ دسترسی شما تأیید شد.")
     except:
         await update.message.reply_text("❗️ دستور نادرست. استفاده صحیح:\n/allow user_id")
 
 async def show_admin_menu(update: Update):
-    keyboard = [["📄 لیست کاربران", "📢 پیام همگانی"], ["🧾 خلاصه کاربر", "🗂 خروجی کاربر"], ["📬 پیام به کاربر", "❌ خروج از پنل"]]
+    keyboard = [["📄 لیست کاربران", "📢 پیام همگانی"], ["🧾 خلاصه کاربر", "🗂 خروجی کاربر"], ["📬 پیام به کاربر", "📈 آمار کلی"], ["❌ خروج از پنل"]]
     await update.message.reply_text("🎛 پنل ادمین فعال شد.", reply_markup=ReplyKeyboardMarkup(keyboard + reply_keyboard, resize_keyboard=True))
 
-async def handle_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    user_id_str = str(user_id)
-    username = update.effective_user.first_name or "کاربر"
-    text = update.message.text
-    now = datetime.now()
+async def users_page(after_id=None, before_id=None):
+    # مستقیم از SQLite با keyset، چون registry هر worker فقط کاربران shard خودش را به‌روز دارد
+    users = await storage.page_users(after_id, before_id, USERS_PAGE_SIZE)
+    if not users and before_id is None:
+        users = await storage.page_users(limit=USERS_PAGE_SIZE)
+    total = await storage.count_users()
+    before = await storage.count_users(users[0]) if users else 0
+    pages = max(1, -(-total // USERS_PAGE_SIZE))
+    nav = []
+    if before > 0:
+        nav.append(InlineKeyboardButton("◀️ قبلی", callback_data=f"users:p:{users[0]}"))
+    if users and before + len(users) < total:
+        nav.append(InlineKeyboardButton("بعدی ▶️", callback_data=f"users:n:{users[-1]}"))
+    text = (f"👥 تعداد کاربران: {total}\n📄 صفحه {before // USERS_PAGE_SIZE + 1}/{pages}\n"
+            + "\n".join(str(uid) for uid in users))
+    return text, InlineKeyboardMarkup([nav]) if nav else None
 
-    if user_states.get(user_id) == WAITING_FOR_PASSWORD:
-        if text == ADMIN_PASSWORD:
-            await context.bot.send_message(ADMIN_MAIN_ID, f"📅 درخواست دسترسی از {user_id} دریافت شد.\n/allow {user_id}")
-            await update.message.reply_text("⏳ درخواست شما برای ادمین ارسال شد.")
-        else:
-            await update.message.reply_text("❌ رمز اشتباه است.")
-        user_states.pop(user_id)
+async def users_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if update.effective_user.id not in ADMIN_PANEL:
+        await query.answer()
         return
+    _, direction, user_id = query.data.split(":")
+    text, keyboard = await (users_page(after_id=int(user_id)) if direction == "n" else users_page(before_id=int(user_id)))
+    await query.answer()
+    await query.edit_message_text(text, reply_markup=keyboard)
 
-    if user_id in ADMIN_PANEL:
-        state = user_states.get(user_id)
-        if text == "📄 لیست کاربران":
-            users = os.listdir(DATA_FOLDER)
-            await update.message.reply_text(f"👥 تعداد کاربران: {len(users)}\n" + "\n".join(users))
-            return
-        elif text == "📢 پیام همگانی":
-            user_states[user_id] = TYPING_BROADCAST
-            await update.message.reply_text("📨 پیام خود را وارد کنید تا برای همه کاربران ارسال شود.")
-            return
-        elif text == "🗂 خروجی کاربر":
-            user_states[user_id] = TYPING_EXPORT_ID
-            await update.message.reply_text("🔍 لطفاً آیدی کاربر موردنظر را وارد کنید:")
-            return
-        elif text == "🧾 خلاصه کاربر":
-            user_states[user_id] = TYPING_SUMMARY_ID
-            await update.message.reply_text("🔎 لطفاً آیدی کاربر را برای خلاصه آماری وارد کنید:")
-            return
-        elif text == "📬 پیام به کاربر":
-            user_states[user_id] = TYPING_PRIVATE_IDS
-            await update.message.reply_text("👤 آیدی یا آیدی‌های کاربران را وارد کن (با کاما جدا کن):")
-            return
-        elif text == "❌ خروج از پنل":
-            ADMIN_PANEL.remove(user_id)
-            await update.message.reply_text("🛑 از حالت ادمین خارج شدید.", reply_markup=markup)
-            return
-        elif state == TYPING_BROADCAST:
-            user_states.pop(user_id)
-            success, fail = 0, 0
-            for filename in os.listdir(DATA_FOLDER):
-                if filename.endswith(".json") and filename.replace(".json", "").isdigit():
-                    uid = int(filename.replace(".json", ""))
-                    try:
-                        await context.bot.send_message(uid, f"📢 پیام از ادمین:\n{text}")
-                        success += 1
-                    except:
-                        fail += 1
-            await update.message.reply_text(f"✅ پیام برای {success} نفر ارسال شد.\n❌ شکست‌خورده: {fail}")
-            return
-        elif state == TYPING_EXPORT_ID:
-            user_states.pop(user_id)
-            file_path = os.path.join(DATA_FOLDER, f"{text}.json")
-            if not os.path.exists(file_path):
-                await update.message.reply_text("❌ کاربری با این آیدی یافت نشد.")
-                return
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            messages = [f"📅 {d}: " + ", ".join([f"{k}={v}" for k, v in t.items()]) for d, t in data.get("moods", {}).items()]
-            await update.message.reply_text("\n".join(messages) or "❗️ دیتایی ثبت نشده.")
-            return
-        elif state == TYPING_SUMMARY_ID:
-            user_states.pop(user_id)
-            file_path = os.path.join(DATA_FOLDER, f"{text}.json")
-            if not os.path.exists(file_path):
-                await update.message.reply_text("❌ کاربری با این آیدی یافت نشد.")
-                return
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            all_scores = []
-            for day in data["moods"].values():
-                all_scores.extend([int(s) for s in day.values()])
-            avg = sum(all_scores)/len(all_scores) if all_scores else 0
-            await update.message.reply_text(f"📊 میانگین نمره: {avg:.2f}\nروزهای فعال: {len(data['moods'])}\nآخرین روز: {max(data['moods']) if data['moods'] else '---'}")
-            return
-        elif state == TYPING_PRIVATE_IDS:
-            user_states[user_id] = (TYPING_PRIVATE_MESSAGE, text.split(","))
-            await update.message.reply_text("📝 حالا متن پیامی که می‌خوای بفرستی رو بنویس:")
-            return
-        elif isinstance(state, tuple) and state[0] == TYPING_PRIVATE_MESSAGE:
-            ids = [i.strip() for i in state[1]]
-            user_states.pop(user_id)
-            success = 0
-            fail = 0
-            for uid in ids:
-                try:
-                    await context.bot.send_message(int(uid), f"📬 پیام اختصاصی از ادمین:\n{text}")
-                    success += 1
-                except:
-                    fail += 1
-            await update.message.reply_text(f"✅ پیام برای {success} نفر ارسال شد.\n❌ شکست‌خورده: {fail}")
-            return
+async def mood_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    parsed = parse_mood_callback(query.data, len(TIME_SLOTS))
+    if parsed is None:
+        await query.answer("❌ نمره نامعتبر است.")
+        return
+    date, slot_index, score = parsed
+    slot = TIME_SLOTS[slot_index]
+    await writer.add_mood(update.effective_user.id, date, slot, score)
+    await query.answer("✅ ثبت شد")
+    await query.edit_message_text(f"✅ حال «{slot}» روز {date} با نمره {score} ثبت شد.")
+
+@router.route("global", "password", state=WAITING_FOR_PASSWORD)
+async def check_password(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    user_id = update.effective_user.id
+    # پیش از ارسال؛ اگر پیام به outbox برود (Deferred) جلسه نباید در حالت رمز بماند
+    sessions.pop(user_id)
+    if update.message.text == ADMIN_PASSWORD:
+        await context.bot.send_message(ADMIN_MAIN_ID, f"📅 درخواست دسترسی از {user_id} دریافت شد.\n/allow {user_id}")
+        await update.message.reply_text("⏳ درخواست شما برای ادمین ارسال شد.")
+    else:
+        await update.message.reply_text("❌ رمز اشتباه است.")
+
+@router.route("admin", "users_list", text="📄 لیست کاربران")
+async def list_users(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    page_text, keyboard = await users_page()
+    await update.message.reply_text(page_text, reply_markup=keyboard)
+
+@router.route("admin", "broadcast_prompt", text="📢 پیام همگانی")
+async def broadcast_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    sessions.set(update.effective_user.id, TYPING_BROADCAST)
+    await update.message.reply_text("📨 پیام خود را وارد کنید تا برای همه کاربران ارسال شود.")
+
+@router.route("admin", "export_prompt", text="🗂 خروجی کاربر")
+async def export_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    sessions.set(update.effective_user.id, TYPING_EXPORT_ID)
+    await update.message.reply_text("🔍 لطفاً آیدی کاربر موردنظر را وارد کنید (یا «همه» برای همه کاربران).\nبرای خروجی JSONL بعد از آیدی بنویس jsonl، مثلاً: 12345 jsonl")
+
+@router.route("admin", "summary_prompt", text="🧾 خلاصه کاربر")
+async def summary_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    sessions.set(update.effective_user.id, TYPING_SUMMARY_ID)
+    await update.message.reply_text("🔎 لطفاً آیدی کاربر را برای خلاصه آماری وارد کنید:")
+
+@router.route("admin", "analytics", text="📈 آمار کلی")
+async def send_analytics(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    from analytics import ANALYTICS_MAX_AGE
+    analytics = get_mood_cube()
+    if not len(analytics):
+        await update.message.reply_text("⏳ در حال ساخت آمار اولیه...")
+    await run_io(analytics.refresh, storage.sync, max_age=ANALYTICS_MAX_AGE)
+    retention = await run_io(analytics.retention)
+    risky = await run_io(analytics.at_risk)
+    # همه متدهای MoodCube قفل آن را می‌گیرند و ممکن است پشت refresh یک worker دیگر بمانند؛ هیچ‌کدام روی حلقه اجرا نمی‌شود
+    dau = await run_io(analytics.daily_active, 30)
+    slots = await run_io(analytics.slot_distribution)
+    await update.message.reply_text(analytics_text(dau, slots, retention, risky))
+
+@router.route("admin", "private_prompt", text="📬 پیام به کاربر")
+async def private_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    sessions.set(update.effective_user.id, TYPING_PRIVATE_IDS)
+    await update.message.reply_text("👤 آیدی یا آیدی‌های کاربران را وارد کن (با کاما جدا کن):")
 
-    if text == "🧠 خالی کردن ذهن":
-        user_states[user_id] = TYPING_THOUGHT
-        await update.message.reply_text("📝 بنویس هرچی تو ذهنت هست:")
+@router.route("admin", "exit_panel", text="❌ خروج از پنل")
+async def exit_panel(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    await ADMIN_PANEL.discard(update.effective_user.id)
+    await update.message.reply_text("🛑 از حالت ادمین خارج شدید.", reply_markup=markup)
+
+@router.route("admin", "broadcast", state=TYPING_BROADCAST)
+async def send_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    user_id = update.effective_user.id
+    sessions.pop(user_id)
+    # در حالت تک worker همه /start ها از همین پردازه رد شده‌اند و registry کامل است
+    targets = registry.ids() if WORKERS == 1 else await storage.user_ids()
+    await start_broadcast(context.bot, user_id, f"📢 پیام از ادمین:\n{update.message.text}", targets)
+
+async def start_broadcast(bot, admin_id, text, targets, fail=0):
+    # در حالت چند worker ارسال به رهبر سپرده می‌شود تا سقف ارسال سراسری فقط یک مصرف‌کننده انبوه داشته باشد
+    local = WORKERS == 1 or elector.is_leader
+    await broadcasts.start(bot, admin_id, text, targets, fail, spawn=local)
+    if not local:
+        await bot.send_message(admin_id, "📢 پیام ثبت شد و ارسال آن تا چند ثانیه دیگر شروع می‌شود.")
+
+async def known_user(text):
+    return text.isdigit() and await storage.has_user(text)
+
+@router.route("admin", "export", state=TYPING_EXPORT_ID)
+async def send_export(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    sessions.pop(update.effective_user.id)
+    parts = update.message.text.split()
+    target = parts[0] if parts else ""
+    fmt = parts[1].lower() if len(parts) > 1 and parts[1].lower() in EXPORT_FORMATS else "csv"
+    if target == "همه":
+        await update.message.reply_text("⏳ در حال ساخت خروجی همه کاربران...")
+        parts = await run_io(export_all, storage.sync, await storage.user_ids(), fmt)
+        stamp = f"export_all_{datetime.now():%Y%m%d}"
+        files = [(doc, f"{stamp}.zip" if len(parts) == 1 else f"{stamp}_{i}of{len(parts)}.zip")
+                 for i, doc in enumerate(parts, 1)]
+    elif await known_user(target):
+        files = [(await run_io(export_user, storage.sync, target, fmt), f"export_{target}.{fmt}")]
+    else:
+        await update.message.reply_text("❌ کاربری با این آیدی یافت نشد.")
         return
+    try:
+        for doc, filename in files:
+            # PTB کل فایل را در حافظه می‌خواند؛ این کار بیرون از event loop انجام می‌شود
+            data = await run_io(doc.read)
+            await update.message.reply_document(document=data, filename=filename)
+    finally:
+        for doc, _ in files:
+            doc.close()
 
-    if user_states.get(user_id) == TYPING_THOUGHT:
-        user_states.pop(user_id)
-        filepath = os.path.join(THOUGHTS_FOLDER, f"{user_id_str}.txt")
-        with open(filepath, "a", encoding="utf-8") as f:
-            f.write(f"[{now}] {text}\n")
-        await update.message.reply_text(f"خیلی خوبه {username}، خوشحالم که ذهنت رو خالی کردی 💚 هر وقت دوباره خواستی، من همینجام.")
+@router.route("admin", "summary", state=TYPING_SUMMARY_ID)
+async def send_summary(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    sessions.pop(update.effective_user.id)
+    text = update.message.text.strip()
+    if not await known_user(text):
+        await update.message.reply_text("❌ کاربری با این آیدی یافت نشد.")
         return
+    agg = await storage.get_aggregate(text)
+    await update.message.reply_text(f"📊 میانگین نمره: {aggregates.average(agg):.2f}\nروزهای فعال: {agg['active_days']}\nآخرین روز: {agg['last_day'] or '---'}")
 
-    if text in ["وضعیت هفته", "وضعیت ماه"]:
-        file_path = os.path.join(DATA_FOLDER, f"{user_id_str}.json")
-        if not os.path.exists(file_path):
-            await update.message.reply_text("❗️ ابتدا با /start ثبت‌نام کن.")
-            return
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        mood_dates = list(data.get("moods", {}).keys())
-        required = 7 if "هفته" in text else 30
-        if len(mood_dates) < required:
-            await update.message.reply_text(f"📊 برای دریافت گزارش باید {required} روز ثبت‌نام داشته باشی. فقط {len(mood_dates)} روز داری.")
-            return
-        scores_by_day = []
-        for date in sorted(data["moods"].keys())[-14:]:
-            entries = data["moods"][date].values()
-            avg = sum(int(s) for s in entries) / len(entries)
-            scores_by_day.append((date, avg))
-        dates = [x[0] for x in scores_by_day]
-        scores = [x[1] for x in scores_by_day]
-        plt.figure(figsize=(10, 5))
-        plt.plot(dates, scores, marker='o')
-        plt.title(text)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        chart_path = f"chart_{user_id}.png"
-        plt.savefig(chart_path)
-        plt.close()
-        await update.message.reply_photo(photo=open(chart_path, "rb"))
+@router.route("admin", "private_ids", state=TYPING_PRIVATE_IDS)
+async def private_ids(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    sessions.set(update.effective_user.id, TYPING_PRIVATE_MESSAGE, update.message.text.split(","))
+    await update.message.reply_text("📝 حالا متن پیامی که می‌خوای بفرستی رو بنویس:")
+
+@router.route("admin", "private_message", state=TYPING_PRIVATE_MESSAGE)
+async def send_private_message(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    user_id = update.effective_user.id
+    ids = [i.strip() for i in session.targets]
+    sessions.pop(user_id)
+    targets = [int(i) for i in ids if i.isdigit()]
+    await start_broadcast(context.bot, user_id, f"📬 پیام اختصاصی از ادمین:\n{update.message.text}", targets, fail=len(ids) - len(targets))
+
+@router.route("user", "thought_prompt", text="🧠 خالی کردن ذهن")
+async def thought_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    sessions.set(update.effective_user.id, TYPING_THOUGHT)
+    await update.message.reply_text("📝 بنویس هرچی تو ذهنت هست:")
+
+@router.route("user", "thought", state=TYPING_THOUGHT)
+async def save_thought(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    user_id = update.effective_user.id
+    username = update.effective_user.first_name or "کاربر"
+    sessions.pop(user_id)
+    await writer.add_thought(user_id, datetime.now(), update.message.text)
+    await update.message.reply_text(f"خیلی خوبه {username}، خوشحالم که ذهنت رو خالی کردی 💚 هر وقت دوباره خواستی، من همینجام.")
+
+def history_text(title, rows):
+    if not rows:
+        return f"{title}\n\n📭 چیزی پیدا نشد."
+    entries = [f"🗓 {ts[:16]}\n{text if len(text) <= THOUGHT_PREVIEW else text[:THOUGHT_PREVIEW] + '…'}"
+               for _, ts, text in rows]
+    return f"{title}\n\n" + "\n\n".join(entries)
+
+def history_keyboard(rows, more, older):
+    # older: پیشوند callback صفحه قبلی؛ آیدی آخرین یادداشت صفحه کلید keyset است
+    keyboard = []
+    if more:
+        keyboard.append([InlineKeyboardButton("◀️ قدیمی‌تر", callback_data=f"{older}{rows[-1][0]}")])
+    keyboard.append([InlineKeyboardButton("همه", callback_data="thoughts:a:0"),
+                     InlineKeyboardButton("۷ روز", callback_data="thoughts:w:0"),
+                     InlineKeyboardButton("۳۰ روز", callback_data="thoughts:m:0"),
+                     InlineKeyboardButton("🔍 جستجو", callback_data="tsearch:new")])
+    return InlineKeyboardMarkup(keyboard)
+
+async def history_page(user_id, mode, before_id=None):
+    title, days = HISTORY_RANGES[mode]
+    since = (datetime.now() - timedelta(days=days)).date().isoformat() if days else None
+    rows = await storage.thoughts_page(user_id, before_id, THOUGHTS_PAGE_SIZE + 1, since)
+    return history_text(title, rows[:THOUGHTS_PAGE_SIZE]), history_keyboard(rows[:THOUGHTS_PAGE_SIZE], len(rows) > THOUGHTS_PAGE_SIZE, f"thoughts:{mode}:")
+
+async def search_page(user_id, query, before_id=None):
+    rows = await storage.search_thoughts(user_id, query, before_id, THOUGHTS_PAGE_SIZE + 1)
+    return history_text(f"🔍 «{query}»", rows[:THOUGHTS_PAGE_SIZE]), history_keyboard(rows[:THOUGHTS_PAGE_SIZE], len(rows) > THOUGHTS_PAGE_SIZE, "tsearch:")
+
+@router.route("user", "history", text="📓 هیستوری ذهن")
+async def send_history(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    text, keyboard = await history_page(update.effective_user.id, "a")
+    await update.message.reply_text(text, reply_markup=keyboard)
+
+@router.route("user", "search", state=TYPING_SEARCH)
+async def send_search(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    # عبارت جستجو در نشست می‌ماند تا دکمه «قدیمی‌تر» نتایج بعدی همان جستجو را بیاورد
+    query = update.message.text.strip()
+    sessions.set(update.effective_user.id, BROWSING_SEARCH, query)
+    text, keyboard = await search_page(update.effective_user.id, query)
+    await update.message.reply_text(text, reply_markup=keyboard)
+
+async def history_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    _, mode, before = query.data.split(":")
+    text, keyboard = await history_page(update.effective_user.id, mode, int(before) or None)
+    await query.answer()
+    await query.edit_message_text(text, reply_markup=keyboard)
+
+async def search_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    user_id = update.effective_user.id
+    arg = query.data.split(":")[1]
+    if arg == "new":
+        sessions.set(user_id, TYPING_SEARCH)
+        await query.answer()
+        await query.message.reply_text("🔍 کلمه یا کلمه‌هایی که دنبالشان هستی را بنویس:")
         return
+    session = sessions.get(user_id)
+    if session is None or session.state != BROWSING_SEARCH:
+        await query.answer("⌛ این جستجو منقضی شده؛ دوباره جستجو کن.")
+        return
+    text, keyboard = await search_page(user_id, session.targets, int(arg))
+    await query.answer()
+    await query.edit_message_text(text, reply_markup=keyboard)
+
+@router.route("user", "report", text="وضعیت ماه")
+@router.route("user", "report", text="وضعیت هفته")
+async def send_report(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    user_id = update.effective_user.id
+    text = update.message.text
+    version = await storage.get_version(user_id)
+    if version is None:
+        await update.message.reply_text("❗️ ابتدا با /start ثبت‌نام کن.")
+        return
+    kind = "week" if "هفته" in text else "month"
+    agg = await storage.get_aggregate(user_id)
+    days = agg["active_days"]
+    _, required = REPORTS[kind]
+    if days < required:
+        await update.message.reply_text(f"📊 برای دریافت گزارش باید {required} روز ثبت‌نام داشته باشی. فقط {days} روز داری.")
+        return
+    # هفته و ماه یک نمودار مشترک دارند
+    chart = charts.get_cached(user_id, version)
+    if chart is None:
+        # نمودار شبانه ساخته شده؛ تا نمره جدیدی ثبت نشود version عوض نمی‌شود
+        chart = await run_io(report_cache.get, user_id, version)
+        if chart is not None:
+            CHART_CACHE.inc(result="pregen")
+            charts.put(user_id, version, chart)
+    if chart is None:
+        render = charts.render_task(user_id, version, *chart_series(agg), CHART_TITLE)
+        try:
+            chart = await asyncio.wait_for(asyncio.shield(render), REPORT_WAIT)
+        except asyncio.TimeoutError:
+            # صف رندر شلوغ است؛ هندلر آزاد می‌شود و نمودار بعد از آماده شدن فرستاده می‌شود
+            await update.message.reply_text("⏳ نمودارت در حال ساخته شدنه و تا چند لحظه دیگه می‌رسه.")
+            key = (user_id, version)
+            if key not in report_deliveries:
+                task = asyncio.create_task(deliver_report(context.bot, update.effective_chat.id, render, report_caption(agg)))
+                report_deliveries[key] = task
+                task.add_done_callback(lambda _: report_deliveries.pop(key, None))
+            return
+    await update.message.reply_photo(photo=chart, caption=report_caption(agg))
+
+async def deliver_report(bot, chat_id, render, caption):
+    try:
+        await bot.send_photo(chat_id, photo=await render, caption=caption)
+    except Exception as e:
+        logging.exception(f"🚨 ارسال نمودار به {chat_id} ناموفق: {e}")
+
+def user_scopes(user_id):
+    return ("global", "admin", "user") if user_id in ADMIN_PANEL else ("global", "user")
+
+def update_action(update):
+    if update.callback_query:
+        return CALLBACK_ACTIONS.get((update.callback_query.data or "").split(":")[0], "callback")
+    text = update.message.text if update.message else None
+    if text is None:
+        return None
+    if text.startswith("/"):
+        return text.split()[0][1:].split("@")[0]
+    user_id = update.effective_user.id
+    session = sessions.get(user_id)
+    entry = router.resolve(user_scopes(user_id), session.state if session else None, text)
+    return entry[0] if entry else "unknown"
+
+def report_key(update):
+    # ضربه‌های پشت سر هم روی دکمه گزارش تا وقتی اولی تمام نشده فقط یک بار پردازش می‌شوند
+    text = update.message.text if update.message else None
+    if text in REPORT_TEXTS:
+        return update.effective_user.id, text
+    return None
+
+# قبل از ورود آپدیت به صف کاربر (در UserOrderedUpdateProcessor) اجرا می‌شود؛ آپدیت‌های صف‌شده هم سهم مصرف می‌کنند.
+# نام کار با وضعیت نشست در لحظه رسیدن آپدیت تعیین می‌شود.
+async def admit_update(update):
+    user_id = update.effective_user.id
+    action = update_action(update)
+    if action is None or throttle.allow(user_id, action):
+        return True
+    THROTTLED.inc(action=action)
+    if throttle.warn_once(user_id):
+        notice = "⏳ درخواست‌هایت زیاد شده؛ چند لحظه صبر کن و دوباره امتحان کن."
+        try:
+            if update.callback_query:
+                await update.callback_query.answer(notice)
+            else:
+                await update.message.reply_text(notice)
+        except TelegramError as e:
+            logging.info(f"⏳ پیام محدودیت به {user_id} نرسید: {e}")
+    return False
+
+async def handle_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    session = sessions.get(user_id)
+    state = session.state if session else None
+    # دکمه‌ای که وسط نوشتن (فکر، پیام همگانی، آیدی و ...) زده شود، آن حالت را لغو می‌کند
+    if not await router.dispatch(user_scopes(user_id), state, update.message.text, update, context, session,
+                                 on_preempt=lambda: sessions.pop(user_id)):
+        await update.message.reply_text("⏳ لطفاً فقط از گزینه‌های کیبورد استفاده کن یا حالتت رو وارد کن.")
+
+def report_caption(agg):
+    lines = [f"📊 میانگین کل: {aggregates.average(agg):.2f}", f"🔥 روزهای پشت سر هم: {aggregates.streak(agg)}"]
+    trend = aggregates.trend(agg)
+    if trend is not None:
+        lines.append(f"📈 تغییر هفته اخیر: {trend:+.2f}")
+    slot_avgs = aggregates.slot_averages(agg)
+    lines += [f"• {slot}: {slot_avgs[slot]:.1f}" for slot in TIME_SLOTS if slot in slot_avgs]
+    return "\n".join(lines)
+
+def analytics_text(dau, slots, retention, risky):
+    values = [v for _, v in dau]
+    lines = [f"👥 کاربران فعال امروز: {values[-1]}  |  میانگین ۷ روز: {sum(values[-7:]) / 7:.1f}  |  ۳۰ روز: {sum(values) / len(values):.1f}",
+             "", "🕐 توزیع نمره‌ها در هر نوبت (۱ تا ۱۰):"]
+    for slot, (counts, mean) in slots.items():
+        lines.append(f"{slot}: میانگین {mean:.2f}  [{' '.join(map(str, counts))}]")
+    lines += ["", "📅 ماندگاری بر اساس هفته عضویت (٪ فعال در هفته ۰، ۱، ...):"]
+    for week, size, rates in retention:
+        if size:
+            lines.append(f"{week} ({size} نفر): {' '.join(f'{r:g}' for r in rates)}")
+    total, worst = risky
+    lines += ["", f"⚠️ کاربران در معرض خطر (افت میانگین): {total}"]
+    lines += [f"{uid}: {before:.1f} ← {recent:.1f}" for uid, before, recent in worst]
+    return "\n".join(lines)
 
-    await update.message.reply_text("⏳ لطفاً فقط از گزینه‌های کیبورد استفاده کن یا حالتت رو وارد کن.")
+def mark_ready():
+    elapsed = time.perf_counter() - _started
+    STARTUP.set(elapsed)
+    logging.info(f"✅ ربات در {elapsed:.2f} ثانیه آماده شد.")
 
-def restart_bot():
-    logging.warning("⏱ نیاز به ری‌استارت ربات ولی در محیط محدود هستیم، فقط sleep می‌کنیم.")
-    time.sleep(10)
+async def on_error(update, context):
+    # پیام‌های ذخیره‌شده در outbox و قطعی‌های گذرا stack trace لازم ندارند
+    if isinstance(context.error, Deferred):
+        logging.info(f"📮 {context.error}")
+    elif isinstance(context.error, NetworkError):
+        logging.warning(f"🌐 خطای شبکه در پردازش آپدیت: {context.error}")
+    else:
+        logging.error("🚨 خطا در پردازش آپدیت", exc_info=context.error)
+
+# کارهای زمان‌بندی‌شده فقط روی worker رهبر اجرا می‌شوند
+async def on_elected(app):
+    registry.load(await storage.user_ids())
+    send_limiter.set_global_rate(GLOBAL_SEND_RATE)
+    backups.start()
+    broadcasts.watch(app.bot)
+    reminders.start(app.bot)
+    outbox.start(app.bot)
+    pregen.start()
 
-def run_dummy_server():
-    import socket
-    port = int(os.environ.get("PORT", 10000))  # استفاده از PORT دینامیک مخصوص Render
-    class DummyHandler(BaseHTTPRequestHandler):
-        def do_GET(self):
-            self.send_response(200)
-            self.end_headers()
-            self.wfile.write(b"Bot is running.")
-    server = HTTPServer(("0.0.0.0", port), DummyHandler)
-    server.serve_forever()
+async def on_demoted():
+    await pregen.stop()
+    await broadcasts.stop_watch()
+    await outbox.stop()
+    await reminders.stop()
+    await backups.stop()
+    send_limiter.set_global_rate(GLOBAL_SEND_RATE / WORKERS)
 
+async def post_init(app):
+    registry.load(await storage.user_ids())
+    if PERSIST_SESSIONS:
+        sessions.load(await storage.load_sessions(SHARD, SHARDS))
+    writer.start()
+    await ADMIN_PANEL.load()
+    ADMIN_PANEL.start()
+    elector.start(lambda: on_elected(app), on_demoted)
 
-threading.Thread(target=run_dummy_server).start()
+async def post_shutdown(app):
+    if elector.is_leader:
+        await on_demoted()
+    await elector.stop()
+    await ADMIN_PANEL.stop()
+    await writer.close()
+    if PERSIST_SESSIONS:
+        await storage.save_sessions(sessions.dump(), SHARD, SHARDS)
 
-async def main():
-    app = ApplicationBuilder().token(TOKEN).read_timeout(10).connect_timeout(10).build()
+def build_app():
+    init_services()
+    builder = (ApplicationBuilder().token(TOKEN)
+               .connection_pool_size(SEND_POOL_SIZE).pool_timeout(5)
+               .connect_timeout(CONNECT_TIMEOUT).read_timeout(10).write_timeout(20)
+               .get_updates_connection_pool_size(1).get_updates_connect_timeout(CONNECT_TIMEOUT)
+               .rate_limiter(ResilientRequests(breaker, outbox))
+               .concurrent_updates(UserOrderedUpdateProcessor(UPDATE_CONCURRENCY, coalesce=report_key, admit=admit_update)))
+    if BOT_API_URL:
+        builder = builder.base_url(BOT_API_URL)
+    app = builder.build()
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("admin", admin))
     app.add_handler(CommandHandler("allow", allow))
+    app.add_handler(CallbackQueryHandler(users_page_callback, pattern=r"^users:[np]:\d+$"))
+    app.add_handler(CallbackQueryHandler(mood_callback, pattern=r"^mood:"))
+    app.add_handler(CallbackQueryHandler(history_callback, pattern=r"^thoughts:[awm]:\d+$"))
+    app.add_handler(CallbackQueryHandler(search_callback, pattern=r"^tsearch:(new|\d+)$"))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_all))
+    app.add_error_handler(on_error)
+    return app
 
+async def run_worker(shard, shards, queue):
+    # آپدیت‌ها از پردازه والد (workers.py) می‌رسند؛ همه کاربران یک shard همیشه به همین worker می‌آیند
+    global SHARD, SHARDS
+    SHARD, SHARDS = shard, shards
+    app = build_app()
+    loop = asyncio.get_running_loop()
+    lag_monitor = asyncio.create_task(monitor_loop_lag())
     try:
-        await app.run_polling(close_loop=False)  # ← همین خط کل مشکل رو حل می‌کنه
-    except (TimedOut, NetworkError) as e:
-        logging.error(f"❌ خطا در اتصال: {e}")
-        restart_bot()
-    except Exception as e:
-        logging.exception(f"🚨 خطای ناشناخته: {e}")
-        time.sleep(5)
-        restart_bot()
+        async with app:
+            await post_init(app)
+            await app.start()
+            mark_ready()
+            while True:
+                raw = await loop.run_in_executor(None, queue.get)
+                if raw is None:
+                    break
+                await app.update_queue.put(Update.de_json(json.loads(raw), app.bot))
+            await app.stop()
+            await post_shutdown(app)
+    finally:
+        lag_monitor.cancel()
+        charts.shutdown()
+        shutdown_io()
 
+async def ingress(pool, stop, use_webhook):
+    # یک دور عمر دریافت آپدیت در حالت چند پردازه؛ خطای راه‌اندازی (get_me، set_webhook) یا توقف polling
+    # به supervise می‌رسد و با backoff دوباره امتحان می‌شود
+    import workers
+    builder = ApplicationBuilder().token(TOKEN).get_updates_connect_timeout(CONNECT_TIMEOUT)
+    if BOT_API_URL:
+        builder = builder.base_url(BOT_API_URL)
+    app = builder.build()
+    async with app:
+        if use_webhook:
+            await app.bot.set_webhook(WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET,
+                                      allowed_updates=Update.ALL_TYPES)
+            tasks = {asyncio.create_task(stop.wait())}
+        else:
+            await app.bot.delete_webhook()
+            tasks = {asyncio.create_task(stop.wait()),
+                     asyncio.create_task(workers.polling_ingress(app.bot, pool, POLL_TIMEOUT))}
+        logging.info(f"🧩 {WORKERS} worker راه‌اندازی شد.")
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+        for task in done:
+            task.result()
 
-if __name__ == "__main__":
-    import asyncio
-    import nest_asyncio
-    import threading
+async def main_sharded(polling=False):
+    import workers
+    pool = workers.WorkerPool(WORKERS)
+    server = HttpServer("0.0.0.0", PORT)
+    server.route("GET", "/", health)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    use_webhook = bool(WEBHOOK_URL) and not polling
+    if use_webhook:
+        server.route("POST", WEBHOOK_PATH, workers.webhook_ingress(pool, WEBHOOK_SECRET))
+    pool.start()
+    supervisor = asyncio.create_task(pool.supervise())
+    try:
+        await server.start()
+        await supervise(lambda: ingress(pool, stop, use_webhook), stop)
+    finally:
+        supervisor.cancel()
+        await pool.stop()
+        await server.stop()
 
-    logging.basicConfig(level=logging.INFO)
-    threading.Thread(target=run_dummy_server).start()
+async def serve(server, stop, use_webhook):
+    # یک دور کامل عمر ربات؛ اگر خطا بدهد supervise با backoff یک app تازه می‌سازد
+    app = build_app()
+    async with app:
+        try:
+            await post_init(app)
+            if use_webhook:
+                server.route("POST", WEBHOOK_PATH, webhook_handler(app, WEBHOOK_SECRET))
+                await app.bot.set_webhook(WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET,
+                                          allowed_updates=Update.ALL_TYPES)
+                logging.info("🪝 حالت webhook فعال شد.")
+            else:
+                await app.bot.delete_webhook()
+                await app.updater.start_polling(timeout=POLL_TIMEOUT, allowed_updates=Update.ALL_TYPES)
+                logging.info("🔄 حالت polling فعال شد.")
+            await app.start()
+            mark_ready()
+            await stop.wait()
+        finally:
+            if app.updater.running:
+                await app.updater.stop()
+            if app.running:
+                await app.stop()
+            await post_shutdown(app)
+
+async def main(polling=False):
+    from storage import migrate_files
+    init_services()
+    await run_io(migrate_files, storage.sync, DATA_FOLDER, THOUGHTS_FOLDER)
+    if WORKERS > 1:
+        await main_sharded(polling)
+        return
+    server = HttpServer("0.0.0.0", PORT)
+    server.route("GET", "/", health)
+    server.route("GET", "/metrics", metrics_endpoint)
+    server.route("GET", "/debug/profile", profile_endpoint)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    use_webhook = bool(WEBHOOK_URL) and not polling
 
-    nest_asyncio.apply()
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(main())
+    lag_monitor = asyncio.create_task(monitor_loop_lag())
+
+    try:
+        await server.start()
+        await supervise(lambda: serve(server, stop, use_webhook), stop)
+    finally:
+        lag_monitor.cancel()
+        await server.stop()
+        charts.shutdown()
+        shutdown_io()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(polling="--polling" in sys.argv))
 
 
 # if __name__ == "__main__":
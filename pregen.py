@@ -0,0 +1,205 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+import aggregates
+from charts import ChartService
+from async_storage import run_io, cancel_task
+from metrics import PREGEN
+
+PREGEN_DELAY = int(os.getenv("PREGEN_DELAY", 7200))
+PREGEN_BATCH = int(os.getenv("PREGEN_BATCH", 50))
+PREGEN_WORKERS = int(os.getenv("PREGEN_WORKERS", 1))
+PREGEN_NICE = int(os.getenv("PREGEN_NICE", 10))
+# سهم زمان دیواری که ساخت گزارش می‌تواند کار کند و سقف load average به ازای هر هسته
+PREGEN_DUTY = float(os.getenv("PREGEN_DUTY", 0.5))
+PREGEN_MAX_LOAD = float(os.getenv("PREGEN_MAX_LOAD", 0.7))
+PREGEN_ACTIVE_DAYS = int(os.getenv("PREGEN_ACTIVE_DAYS", 7))
+PREGEN_CATCHUP_GRACE = int(os.getenv("PREGEN_CATCHUP_GRACE", 6 * 3600))
+LOAD_PAUSE = 5
+CHART_DAYS = 14
+# نمودارها بیرون از moods.db نگه داشته می‌شوند تا هر نمره جدید دیتابیس اصلی را با PNG بازنویسی نکند
+REPORTS_DIR = os.getenv("REPORTS_DIR", "reports")
+REPORTS_CACHE_MB = int(os.getenv("REPORTS_CACHE_MB", 256))
+
+# kind -> (عنوان دکمه، حداقل روز فعال)؛ نمودار هر دو یکی است (۱۴ روز اخیر) و فقط یک بار ساخته می‌شود
+REPORTS = {"week": ("وضعیت هفته", 7), "month": ("وضعیت ماه", 30)}
+CHART_TITLE = f"حال {CHART_DAYS} روز اخیر"
+
+
+def chart_series(agg):
+    scores_by_day = aggregates.recent_days(agg, CHART_DAYS)
+    return [x[0] for x in scores_by_day], [x[1] for x in scores_by_day]
+
+
+def cpu_load():
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return 0
+
+
+class ReportCache:
+    # فایل <user_id>-<version>.png؛ version کاربر با هر نمره بالا می‌رود، پس فایل کهنه هیچ‌وقت خوانده نمی‌شود.
+    # حجم کل به max_bytes محدود است و فایل‌هایی که دیرتر از همه خوانده یا ساخته شده‌اند اول حذف می‌شوند.
+    def __init__(self, folder=REPORTS_DIR, max_bytes=REPORTS_CACHE_MB * 2 ** 20):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._size = None
+
+    def _path(self, user_id, version):
+        return os.path.join(self.folder, f"{int(user_id)}-{version}.png")
+
+    def get(self, user_id, version):
+        path = self._path(user_id, version)
+        try:
+            with open(path, "rb") as f:
+                png = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return png
+
+    def has(self, user_id, version):
+        return os.path.exists(self._path(user_id, version))
+
+    def put(self, user_id, version, png):
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(user_id, version)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(png)
+        os.replace(tmp, path)
+        if self._size is not None:
+            self._size += len(png)
+        if self._size is None or self._size > self.max_bytes:
+            self.prune()
+
+    def prune(self, keep=None):
+        # keep: user_id -> version فعلی کاربران فعال؛ بقیه فایل‌ها (کهنه یا کاربر غیرفعال) حذف می‌شوند
+        files, removed = [], 0
+        try:
+            entries = list(os.scandir(self.folder))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            name = entry.name[:-4] if entry.name.endswith(".png") else None
+            uid, _, version = (name or "").partition("-")
+            try:
+                stale = keep is not None and keep.get(int(uid)) != int(version)
+                st = entry.stat()
+            except (ValueError, FileNotFoundError):
+                continue
+            if stale:
+                removed += self._remove(entry.path)
+            else:
+                files.append((st.st_mtime, st.st_size, entry.path))
+        files.sort()
+        size = sum(f[1] for f in files)
+        for _, file_size, path in files:
+            if size <= self.max_bytes:
+                break
+            size -= file_size
+            removed += self._remove(path)
+        self._size = size
+        return removed
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return 1
+        except FileNotFoundError:
+            return 0
+
+
+class ReportPregenerator:
+    # بعد از آخرین نوبت روز، نمودار گزارش همه کاربران واجد شرایط در ReportCache ساخته می‌شود
+    # تا درخواست‌های فردا (که هم‌زمان می‌رسند) بدون رندر پاسخ بگیرند. فقط روی worker رهبر اجرا می‌شود.
+    def __init__(self, storage, hour, cache, delay=PREGEN_DELAY, batch=PREGEN_BATCH, duty=PREGEN_DUTY,
+                 max_load=PREGEN_MAX_LOAD, active_days=PREGEN_ACTIVE_DAYS, grace=PREGEN_CATCHUP_GRACE):
+        self.storage = storage
+        self.cache = cache
+        self.hour = hour
+        self.delay = delay
+        self.batch = batch
+        self.duty = duty
+        self.max_load = max_load
+        self.active_days = active_days
+        self.grace = grace
+        self.charts = ChartService(workers=PREGEN_WORKERS, cache_size=0, nice=PREGEN_NICE)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        await cancel_task(self._task)
+        self._task = None
+        await run_io(self.charts.shutdown)
+
+    def last_run(self, now):
+        run_at = datetime.combine(now.date(), datetime.min.time()).replace(hour=self.hour) + timedelta(seconds=self.delay)
+        while run_at > now:
+            run_at -= timedelta(days=1)
+        return run_at
+
+    async def _run(self):
+        try:
+            # اگر ربات بعد از زمان اجرا بالا آمده و اجرای امشب انجام نشده، همان اجرا جبران می‌شود
+            now = datetime.now()
+            last = self.last_run(now)
+            done = await self.storage.get_meta("pregen_done") or ""
+            if done < last.isoformat() and (now - last).total_seconds() <= self.grace:
+                await self.run_once(last)
+            while True:
+                now = datetime.now()
+                run_at = self.last_run(now) + timedelta(days=1)
+                await asyncio.sleep((run_at - now).total_seconds())
+                await self.run_once(run_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.exception(f"🚨 ساخت گزارش‌ها متوقف شد: {e}")
+
+    async def run_once(self, run_at=None):
+        run_at = run_at or datetime.now()
+        active_since = (run_at.date() - timedelta(days=self.active_days)).isoformat()
+        min_days = min(required for _, required in REPORTS.values())
+        started = time.monotonic()
+        built, after, keep = 0, 0, {}
+        while True:
+            await self._throttle()
+            rows = await self.storage.report_candidates(min_days, active_since, after, self.batch)
+            if not rows:
+                break
+            after = rows[-1][0]
+            keep.update((uid, version) for uid, version, _ in rows)
+            rows = [row for row, cached in zip(rows, await run_io(self._cached, rows)) if not cached]
+            if not rows:
+                continue
+            batch_started = time.monotonic()
+            pngs = await asyncio.gather(*(self.charts.render_png(*chart_series(agg), CHART_TITLE)
+                                          for _, _, agg in rows))
+            await run_io(self._store, [(uid, version, png) for (uid, version, _), png in zip(rows, pngs)])
+            built += len(rows)
+            PREGEN.inc(len(rows))
+            # duty cycle: بعد از هر دسته به اندازه سهم خودش استراحت می‌کند
+            elapsed = time.monotonic() - batch_started
+            await asyncio.sleep(elapsed * (1 - self.duty) / self.duty)
+        pruned = await run_io(self.cache.prune, keep)
+        await self.storage.set_meta("pregen_done", run_at.isoformat())
+        logging.info(f"🖼 {built} گزارش در {time.monotonic() - started:.0f} ثانیه ساخته شد ({pruned} گزارش کهنه حذف شد).")
+        return built
+
+    def _cached(self, rows):
+        return [self.cache.has(uid, version) for uid, version, _ in rows]
+
+    def _store(self, rows):
+        for uid, version, png in rows:
+            self.cache.put(uid, version, png)
+
+    async def _throttle(self):
+        while cpu_load() > self.max_load:
+            await asyncio.sleep(LOAD_PAUSE)
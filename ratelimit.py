@@ -0,0 +1,113 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+
+GLOBAL_SEND_RATE = float(os.getenv("GLOBAL_SEND_RATE", 25))
+CHAT_SEND_RATE = float(os.getenv("CHAT_SEND_RATE", 1))
+USER_RATE = float(os.getenv("USER_RATE", 0.5))
+USER_BURST = float(os.getenv("USER_BURST", 12))
+MAX_TRACKED_USERS = int(os.getenv("MAX_TRACKED_USERS", 100000))
+# هزینه هر کار به توکن؛ کارهای سنگین (رندر نمودار، خروجی، آمار) و حدس رمز ادمین گران‌ترند
+# /admin هم گران است چون هر حدس رمز به یک /admin قبلش نیاز دارد و حالت نشست هنگام صف شدن هنوز عوض نشده
+ACTION_COSTS = {"report": 4, "export": 10, "analytics": 4, "password": 5, "admin": 5, "thought": 2,
+                "search": 2, "history": 1, "broadcast": 5, "private_message": 5}
+DEFAULT_COST = 1
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, cost=1):
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until or self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+    async def acquire(self, cost=1):
+        # توکن رزرو می‌شود (موجودی می‌تواند منفی شود) تا منتظرها به ترتیب نوبت بگیرند
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= cost
+        wait = max(self.blocked_until - now, -self.tokens / self.rate)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def block(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class SendLimiter:
+    # سقف کلی ربات و سقف هر چت تلگرام، با LRU برای سطل‌های هر چت
+    def __init__(self, global_rate=GLOBAL_SEND_RATE, chat_rate=CHAT_SEND_RATE, max_chats=10000):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.max_chats = max_chats
+        self._chats = OrderedDict()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, 1)
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def acquire(self, chat_id):
+        await self._chat_bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+
+    def retry_after(self, seconds):
+        self.global_bucket.block(seconds)
+
+    def set_global_rate(self, rate):
+        self.global_bucket.rate = self.global_bucket.capacity = rate
+        self.global_bucket.tokens = min(self.global_bucket.tokens, rate)
+
+
+class UserThrottle:
+    # سطل توکن هر کاربر با LRU؛ در حالت چند worker هر کاربر همیشه به یک پردازه می‌رسد، پس سطل محلی کافی است
+    def __init__(self, rate=USER_RATE, burst=USER_BURST, costs=ACTION_COSTS, max_users=MAX_TRACKED_USERS):
+        self.rate = rate
+        self.burst = burst
+        self.costs = costs
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._warned = set()
+
+    def _bucket(self, user_id):
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            bucket = self._users[user_id] = TokenBucket(self.rate, self.burst)
+            if len(self._users) > self.max_users:
+                evicted, _ = self._users.popitem(last=False)
+                self._warned.discard(evicted)
+        else:
+            self._users.move_to_end(user_id)
+        return bucket
+
+    def allow(self, user_id, action):
+        if self._bucket(user_id).try_acquire(self.costs.get(action, DEFAULT_COST)):
+            self._warned.discard(user_id)
+            return True
+        return False
+
+    def warn_once(self, user_id):
+        # فقط اولین درخواست رد شده پیام می‌گیرد تا اسپم به ارسال پیام تبدیل نشود
+        if user_id in self._warned:
+            return False
+        self._warned.add(user_id)
+        return True
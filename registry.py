@@ -0,0 +1,28 @@
+class UserRegistry:
+    def __init__(self):
+        self._ids = []
+        self._members = set()
+
+    def load(self, user_ids):
+        self._ids = list(user_ids)
+        self._members = set(self._ids)
+
+    def add(self, user_id):
+        user_id = int(user_id)
+        if user_id in self._members:
+            return False
+        self._members.add(user_id)
+        self._ids.append(user_id)
+        return True
+
+    def __contains__(self, user_id):
+        try:
+            return int(user_id) in self._members
+        except (TypeError, ValueError):
+            return False
+
+    def __len__(self):
+        return len(self._members)
+
+    def ids(self):
+        return list(self._ids)
@@ -0,0 +1,132 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, date as date_cls
+from telegram import InlineKeyboardMarkup, InlineKeyboardButton
+from broadcast import send_with_retry
+from async_storage import cancel_task
+
+REMINDER_JITTER = int(os.getenv("REMINDER_JITTER", 600))
+REMINDER_TICK = 1.0
+CATCHUP_GRACE = int(os.getenv("REMINDER_CATCHUP_GRACE", 3600))
+# ثبت حال برای چند روز گذشته (یادآورهای دیروز که دیر جواب داده شده‌اند) مجاز است، نه آینده
+MOOD_BACKFILL_DAYS = int(os.getenv("MOOD_BACKFILL_DAYS", 2))
+SCORES = range(1, 11)
+
+
+def mood_keyboard(date, slot_index):
+    buttons = [InlineKeyboardButton(str(s), callback_data=f"mood:{date}:{slot_index}:{s}") for s in SCORES]
+    return InlineKeyboardMarkup([buttons[:5], buttons[5:]])
+
+
+def parse_mood_callback(data, slot_count, today=None, backfill=MOOD_BACKFILL_DAYS):
+    # callback_data از سمت کاربر می‌آید و باید دوباره اعتبارسنجی شود
+    try:
+        _, date, slot_index, score = data.split(":")
+        day = date_cls.fromisoformat(date)
+        slot_index, score = int(slot_index), int(score)
+    except ValueError:
+        return None
+    if not 0 <= slot_index < slot_count or score not in SCORES:
+        return None
+    # تاریخ جعلی (آینده یا خیلی قدیمی) last_day، حلقه‌ی ۳۰ روزه و streak را خراب می‌کند
+    today = today or datetime.now().date()
+    if not today - timedelta(days=backfill) <= day <= today:
+        return None
+    return day.isoformat(), slot_index, score
+
+
+class ReminderScheduler:
+    def __init__(self, storage, registry, limiter, reminders, jitter=REMINDER_JITTER, grace=CATCHUP_GRACE, reload=False):
+        self.storage = storage
+        self.registry = registry
+        # reload: registry فقط کاربران یک shard را به‌روز دارد و پیش از هر نوبت از Storage خوانده می‌شود
+        self.reload = reload
+        self.limiter = limiter
+        self.slots = list(reminders)
+        self.hours = reminders
+        self.jitter = jitter
+        self.grace = grace
+        self._task = None
+
+    def start(self, bot):
+        self._task = asyncio.create_task(self._run(bot))
+
+    async def stop(self):
+        await cancel_task(self._task)
+        self._task = None
+
+    def _fire_times(self, day):
+        return sorted((datetime.combine(day, datetime.min.time()).replace(hour=h), slot) for slot, h in self.hours.items())
+
+    def next_fire(self, now):
+        for fire_at, slot in self._fire_times(now.date()) + self._fire_times(now.date() + timedelta(days=1)):
+            if fire_at > now:
+                return fire_at, slot
+
+    def last_fire(self, now):
+        past = [f for f in self._fire_times(now.date() - timedelta(days=1)) + self._fire_times(now.date()) if f[0] <= now]
+        return past[-1]
+
+    async def _run(self, bot):
+        try:
+            last = datetime.now()
+            await self._catch_up(bot)
+            while True:
+                # نوبت بعد از آخرین نوبت اجراشده، نه بعد از الان؛ اگر ارسال یک نوبت طول بکشد نوبت‌های
+                # گذشته در این فاصله (تا grace) با تأخیر ارسال می‌شوند، نه اینکه بی‌صدا رد شوند
+                fire_at, slot = self.next_fire(last)
+                last = fire_at
+                now = datetime.now()
+                if (now - fire_at).total_seconds() > self.grace:
+                    logging.warning(f"⏰ نوبت «{slot}» {fire_at:%Y-%m-%d %H:%M} خیلی دیر شده و ارسال نمی‌شود.")
+                    continue
+                await asyncio.sleep(max(0, (fire_at - now).total_seconds()))
+                await self.fire(bot, fire_at.date().isoformat(), slot)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.exception(f"🚨 زمان‌بند یادآوری متوقف شد: {e}")
+
+    async def _catch_up(self, bot):
+        # اگر ربات وسط یا قبل از ارسال آخرین نوبت ری‌استارت شده، همان نوبت (فقط اگر هنوز تازه است) ادامه پیدا می‌کند
+        now = datetime.now()
+        fire_at, slot = self.last_fire(now)
+        if (now - fire_at).total_seconds() > self.grace:
+            return
+        key = f"{fire_at.date().isoformat()}|{slot}"
+        state = (await self.storage.get_meta("reminder_state") or "").split("|")
+        start_tick = 0
+        if "|".join(state[:2]) == key:
+            if state[2] == "done":
+                return
+            start_tick = int(state[2])
+        logging.info(f"⏰ جبران یادآوری {key} از تیک {start_tick}")
+        await self.fire(bot, fire_at.date().isoformat(), slot, start_tick)
+
+    async def fire(self, bot, date, slot, start_tick=0):
+        # کاربرانی که در worker های دیگر /start زده‌اند هم باید پیام بگیرند
+        if self.reload:
+            self.registry.load(await self.storage.user_ids())
+        ticks = max(1, int(self.jitter / REMINDER_TICK))
+        # timer wheel: هر کاربر با هش ثابت به یک تیک از پنجره jitter می‌افتد تا ارسال‌ها پخش شوند
+        wheel = [[] for _ in range(ticks)]
+        for uid in self.registry.ids():
+            wheel[(uid * 2654435761) % ticks].append(uid)
+        text = f"⏰ وقت ثبت حال «{slot}» است! از ۱ تا ۱۰ به حالت نمره بده:"
+        keyboard = mood_keyboard(date, self.slots.index(slot))
+        started = time.monotonic() - start_tick * REMINDER_TICK
+        sent = 0
+        for tick in range(start_tick, ticks):
+            delay = started + tick * REMINDER_TICK - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if not wheel[tick]:
+                continue
+            results = await asyncio.gather(*(send_with_retry(bot, self.limiter, uid, text, reply_markup=keyboard)
+                                             for uid in wheel[tick]))
+            sent += sum(results)
+            await self.storage.set_meta("reminder_state", f"{date}|{slot}|{tick + 1}")
+        await self.storage.set_meta("reminder_state", f"{date}|{slot}|done")
+        logging.info(f"⏰ یادآوری «{slot}» {date} برای {sent} کاربر ارسال شد.")
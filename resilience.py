@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from telegram import TelegramObject
+from telegram.error import RetryAfter, NetworkError, TelegramError
+from telegram.ext import BaseRateLimiter
+from async_storage import run_io, cancel_task
+from metrics import BREAKER_STATE, OUTBOX, SENDS
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", 5))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", 30))
+OUTBOX_INTERVAL = float(os.getenv("OUTBOX_INTERVAL", 1))
+OUTBOX_TTL = int(os.getenv("OUTBOX_TTL", 6 * 3600))
+OUTBOX_BATCH = 50
+RESTART_BASE = float(os.getenv("RESTART_BASE", 1))
+RESTART_CAP = float(os.getenv("RESTART_CAP", 120))
+HEALTHY_AFTER = 300
+# فقط پیام‌های متنی ذخیره و دوباره ارسال می‌شوند؛ ویرایش و پاسخ callback بعد از قطعی دیگر معنایی ندارند
+DEFERRABLE = ("sendMessage",)
+NO_DEFER = {"defer": False}
+# فرستنده‌هایی که خودشان با SendLimiter روی 429 مکث می‌کنند (broadcast، یادآور)
+PACED = {"retry_after": False}
+
+
+def transient(error):
+    # TelegramError خام یعنی پاسخ غیر JSON (مثلاً صفحه HTML خطای 502 از load balancer)، نه خطای منطقی API
+    return isinstance(error, NetworkError) or type(error) is TelegramError
+
+
+def backoff(attempt, base=1.0, cap=60.0):
+    # full jitter: هم‌زمان شدن تلاش‌های دوباره بعد از قطعی را پخش می‌کند
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitOpen(NetworkError):
+    def __init__(self):
+        super().__init__("circuit breaker open")
+
+
+class Deferred(NetworkError):
+    # پیام در صف outbox ذخیره شد و بعداً ارسال می‌شود
+    def __init__(self, cause):
+        super().__init__(f"deferred to outbox: {cause}")
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+    def __init__(self, failures=BREAKER_FAILURES, reset=BREAKER_RESET):
+        self.max_failures = failures
+        self.reset = reset
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self._probing = False
+
+    def _set(self, state):
+        if state != self.state:
+            logging.warning(f"🔌 circuit breaker: {('closed', 'open', 'half-open')[state]}")
+        self.state = state
+        BREAKER_STATE.set(state)
+
+    def allow(self):
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset:
+            self._set(self.HALF_OPEN)
+        # در حالت half-open فقط یک درخواست آزمایشی عبور می‌کند
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def ready(self):
+        # بدون مصرف سهمیه درخواست آزمایشی: آیا درخواست بعدی اجازه عبور می‌گیرد؟
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at >= self.reset
+        return self.state == self.CLOSED or not self._probing
+
+    def success(self):
+        self.failures = 0
+        self._probing = False
+        self._set(self.CLOSED)
+
+    def failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.max_failures:
+            self.opened_at = time.monotonic()
+            self._set(self.OPEN)
+
+
+def _plain(value):
+    if isinstance(value, TelegramObject):
+        return value.to_dict()
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def encode_payload(data):
+    # reply_markup و entities به dict تبدیل می‌شوند؛ PTB هنگام ارسال دوباره dict را همان‌طور JSON می‌کند
+    return json.dumps({k: _plain(v) for k, v in data.items()
+                       if v is None or isinstance(v, (str, int, float, bool, list, tuple, TelegramObject))})
+
+
+class ResilientRequests(BaseRateLimiter):
+    # از نقطه توسعه rate_limiter در PTB استفاده می‌شود تا همه درخواست‌های خروجی (جز getUpdates) از breaker رد شوند
+    def __init__(self, breaker, outbox):
+        self.breaker = breaker
+        self.outbox = outbox
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def _defer(self, endpoint, data, rate_limit_args, cause, delay=0):
+        if endpoint in DEFERRABLE and (rate_limit_args or {}).get("defer", True):
+            await self.outbox.put(endpoint, data, delay)
+            raise Deferred(cause) from cause
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        # همه درخواست‌های خروجی (پیام کاربر، broadcast، یادآور، outbox) همین‌جا شمرده می‌شوند
+        if not self.breaker.allow():
+            SENDS.inc(method=endpoint, result="circuit_open")
+            error = CircuitOpen()
+            await self._defer(endpoint, data, rate_limit_args, error)
+            raise error
+        try:
+            result = await callback(*args, **kwargs)
+        except RetryAfter as e:
+            SENDS.inc(method=endpoint, result="retry_after")
+            self.breaker.success()
+            if (rate_limit_args or {}).get("retry_after", True):
+                await self._defer(endpoint, data, rate_limit_args, e, e.retry_after)
+            raise
+        except TelegramError as e:
+            # TimedOut هم زیرکلاس NetworkError است؛ بقیه پاسخ‌های خطای تلگرام یعنی سرویس در دسترس است
+            if not transient(e):
+                SENDS.inc(method=endpoint, result="fail")
+                self.breaker.success()
+                raise
+            SENDS.inc(method=endpoint, result="network_error")
+            self.breaker.failure()
+            await self._defer(endpoint, data, rate_limit_args, e)
+            raise
+        SENDS.inc(method=endpoint, result="success")
+        self.breaker.success()
+        return result
+
+
+class Outbox:
+    # صف پایدار پیام‌هایی که در قطعی ارسال نشدند؛ بعد از ری‌استارت هم باقی می‌مانند
+    def __init__(self, storage, breaker, interval=OUTBOX_INTERVAL, ttl=OUTBOX_TTL):
+        self.storage = storage
+        self.breaker = breaker
+        self.interval = interval
+        self.ttl = ttl
+        self._task = None
+
+    async def put(self, method, data, delay=0):
+        now = time.time()
+        await run_io(self.storage.outbox_put, method, encode_payload(data), now + delay, now + self.ttl)
+        OUTBOX.inc(result="queued")
+
+    def start(self, bot):
+        self._task = asyncio.create_task(self._run(bot))
+
+    async def stop(self):
+        await cancel_task(self._task)
+        self._task = None
+
+    async def _run(self, bot):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.drain(bot)
+            except Exception as e:
+                logging.exception(f"🚨 خطا در ارسال صف outbox: {e}")
+
+    async def drain(self, bot):
+        delivered = 0
+        while self.breaker.ready():
+            rows = await run_io(self.storage.outbox_due, time.time(), OUTBOX_BATCH)
+            if not rows:
+                break
+            for row_id, method, payload, attempts, expires in rows:
+                if expires < time.time():
+                    OUTBOX.inc(result="expired")
+                    await run_io(self.storage.outbox_delete, row_id)
+                    continue
+                try:
+                    await bot.send_message(**json.loads(payload), rate_limit_args=NO_DEFER)
+                except RetryAfter as e:
+                    await asyncio.sleep(e.retry_after)
+                    return delivered
+                except TelegramError as e:
+                    if transient(e):
+                        await run_io(self.storage.outbox_retry, row_id, attempts + 1, time.time() + backoff(attempts))
+                        return delivered
+                    # Forbidden/BadRequest: کاربر ربات را بلاک کرده یا پیام نامعتبر است
+                    logging.info(f"✖️ پیام صف outbox #{row_id} حذف شد: {e}")
+                    OUTBOX.inc(result="dropped")
+                except Exception as e:
+                    logging.error(f"🗑 پیام نامعتبر در صف outbox #{row_id} حذف شد: {e}")
+                    OUTBOX.inc(result="dropped")
+                else:
+                    OUTBOX.inc(result="delivered")
+                    delivered += 1
+                await run_io(self.storage.outbox_delete, row_id)
+        if delivered:
+            logging.info(f"📮 {delivered} پیام از صف outbox ارسال شد.")
+        return delivered
+
+
+async def supervise(run, stop, base=RESTART_BASE, cap=RESTART_CAP):
+    # run یک دور کامل عمر ربات است؛ اگر با خطا تمام شود با backoff و jitter دوباره اجرا می‌شود
+    attempt = 0
+    while not stop.is_set():
+        started = time.monotonic()
+        try:
+            await run()
+            return
+        except TelegramError as e:
+            logging.error(f"❌ خطا در اتصال: {e}")
+        except Exception as e:
+            logging.exception(f"🚨 خطای ناشناخته: {e}")
+        if time.monotonic() - started > HEALTHY_AFTER:
+            attempt = 0
+        delay = backoff(attempt, base, cap)
+        attempt += 1
+        logging.warning(f"🔁 راه‌اندازی دوباره ربات تا {delay:.1f} ثانیه دیگر (تلاش {attempt})")
+        try:
+            await asyncio.wait_for(stop.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
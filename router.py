@@ -0,0 +1,46 @@
+from metrics import HANDLER_LATENCY, timed
+
+ANY = "*"
+
+
+class Router:
+    # جدول‌های dict با کلید (state, text)؛ ترتیب جستجو در هر جدول:
+    # تطبیق کامل، بعد دکمه در هر حالتی (ANY, text)، بعد هر متنی در آن حالت (state, ANY).
+    # یعنی دکمه‌های کیبورد بر حالت منتظر ورودی (مثلاً TYPING_THOUGHT) مقدم‌اند و متن دکمه به‌عنوان ورودی ذخیره نمی‌شود؛
+    # dispatch در این حالت on_preempt را صدا می‌زند تا حالت نیمه‌کاره لغو شود و پیام بعدی کاربر به آن نرود.
+    def __init__(self):
+        self.tables = {}
+
+    def route(self, scope, name, state=ANY, text=ANY):
+        def register(handler):
+            self.tables.setdefault(scope, {})[(state, text)] = (name, handler)
+            return handler
+        return register
+
+    def _lookup(self, scopes, state, text):
+        for scope in scopes:
+            table = self.tables.get(scope)
+            if not table:
+                continue
+            for key in ((state, text), (ANY, text), (state, ANY)):
+                entry = table.get(key)
+                if entry is not None:
+                    return key, entry
+        return None, None
+
+    def resolve(self, scopes, state, text):
+        return self._lookup(scopes, state, text)[1]
+
+    def awaits_input(self, scopes, state):
+        return any((state, ANY) in self.tables.get(scope, ()) for scope in scopes)
+
+    async def dispatch(self, scopes, state, text, *args, on_preempt=None):
+        key, entry = self._lookup(scopes, state, text)
+        if entry is None:
+            return False
+        if on_preempt is not None and state is not None and key[0] == ANY and self.awaits_input(scopes, state):
+            on_preempt()
+        name, handler = entry
+        with timed(HANDLER_LATENCY, handler=name):
+            await handler(*args)
+        return True
@@ -0,0 +1,175 @@
+import json
+import asyncio
+import logging
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from metrics import COALESCED
+
+MAX_BODY = 1024 * 1024
+KEEPALIVE_TIMEOUT = 75
+# semaphore داخلی PTB در UserOrderedUpdateProcessor عملاً بی‌اثر می‌شود
+UNBOUNDED_UPDATES = 2 ** 31 - 1
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 413: "Payload Too Large",
+               429: "Too Many Requests", 500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+class Request:
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+
+class HttpServer:
+    # سرور HTTP حداقلی روی همان event loop ربات؛ هندلرها (status, content_type, body) برمی‌گردانند
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.routes = {}
+        self._server = None
+
+    def route(self, method, path, handler):
+        self.routes[(method, path)] = handler
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logging.info(f"🌐 سرور HTTP روی پورت {self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _read_request(self, reader):
+        line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+        if not line:
+            return None
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            h = await reader.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = h.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY:
+            raise ValueError("body too large")
+        body = await reader.readexactly(length) if length else b""
+        path, _, query = target.partition("?")
+        return Request(method, path, query, headers, body)
+
+    async def _respond(self, writer, status, content_type, body, keep_alive):
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except ValueError:
+                    await self._respond(writer, 400, "text/plain", b"bad request", False)
+                    break
+                if request is None:
+                    break
+                handler = self.routes.get((request.method, request.path))
+                if handler is None:
+                    status, content_type, body = 404, "text/plain", b"not found"
+                else:
+                    try:
+                        status, content_type, body = await handler(request)
+                    except Exception as e:
+                        logging.exception(f"🚨 خطا در {request.path}: {e}")
+                        status, content_type, body = 500, "text/plain", b"error"
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, content_type, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+
+async def health(request):
+    return 200, "text/plain", b"Bot is running."
+
+
+def webhook_handler(app, secret):
+    async def handle(request):
+        if secret and request.headers.get("x-telegram-bot-api-secret-token") != secret:
+            return 403, "text/plain", b"forbidden"
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return 400, "text/plain", b"bad json"
+        if not app.running:
+            # app در حال راه‌اندازی دوباره (supervise) یا خاموش شدن است؛ تلگرام آپدیت را دوباره می‌فرستد
+            return 503, "text/plain", b"restarting"
+        await app.update_queue.put(Update.de_json(data, app.bot))
+        return 200, "text/plain", b"ok"
+    return handle
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    # آپدیت‌های کاربران مختلف هم‌زمان پردازش می‌شوند ولی آپدیت‌های هر کاربر به ترتیب رسیدن.
+    # صف هر کاربر بیرون از semaphore است: آپدیتی فقط وقتی به سر صف کاربرش رسید جای پردازش می‌گیرد،
+    # پس کاربری که پیام پشت سر هم می‌فرستد سهم بقیه را اشغال نمی‌کند.
+    # قبل از ورود به صف: coalesce(update) کلیدی برمی‌گرداند و آپدیتی که کلیدش هنوز در صف یا در حال
+    # پردازش است کنار گذاشته می‌شود؛ admit(update) (async) اگر False برگرداند آپدیت دور ریخته می‌شود.
+    # process_update در PTB نهایی (final) است و همه چیز را زیر semaphore خودش اجرا می‌کند؛ آن semaphore
+    # باز گذاشته می‌شود و سقف واقعی هم‌زمانی _slots است که در do_process_update گرفته می‌شود.
+    __slots__ = ("_locks", "_coalesce", "_admit", "_pending", "_slots")
+
+    def __init__(self, max_concurrent_updates, coalesce=None, admit=None):
+        super().__init__(UNBOUNDED_UPDATES)
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._locks = {}
+        self._coalesce = coalesce
+        self._admit = admit
+        self._pending = set()
+
+    async def do_process_update(self, update, coroutine):
+        user = update.effective_user if isinstance(update, Update) else None
+        if user is None:
+            async with self._slots:
+                await coroutine
+            return
+        key = self._coalesce(update) if self._coalesce else None
+        if key is not None and key in self._pending:
+            COALESCED.inc()
+            coroutine.close()
+            return
+        if self._admit is not None and not await self._admit(update):
+            coroutine.close()
+            return
+        if key is not None:
+            self._pending.add(key)
+        entry = self._locks.get(user.id)
+        if entry is None:
+            entry = self._locks[user.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._slots:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[user.id]
+            self._pending.discard(key)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
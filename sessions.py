@@ -0,0 +1,69 @@
+import os
+import time
+from collections import OrderedDict
+
+SESSION_TTL = int(os.getenv("SESSION_TTL", 3600))
+SESSION_MAX = int(os.getenv("SESSION_MAX", 100000))
+
+
+class Session:
+    __slots__ = ("state", "targets", "touched")
+
+    def __init__(self, state=None, targets=None, touched=None):
+        self.state = state
+        self.targets = targets
+        self.touched = touched or time.time()
+
+
+class SessionStore:
+    # ترتیب OrderedDict همان ترتیب آخرین استفاده است؛ نشست‌های منقضی از ابتدای آن حذف می‌شوند
+    def __init__(self, ttl=SESSION_TTL, max_size=SESSION_MAX):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._sessions = OrderedDict()
+
+    def _evict(self, now):
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if now - session.touched < self.ttl and len(self._sessions) <= self.max_size:
+                break
+            del self._sessions[user_id]
+
+    def get(self, user_id):
+        session = self._sessions.get(user_id)
+        if session is None:
+            return None
+        now = time.time()
+        if now - session.touched >= self.ttl:
+            del self._sessions[user_id]
+            return None
+        return session
+
+    def set(self, user_id, state, targets=None):
+        now = time.time()
+        session = self._sessions.pop(user_id, None) or Session()
+        session.state = state
+        session.targets = targets
+        session.touched = now
+        self._sessions[user_id] = session
+        self._evict(now)
+        return session
+
+    def pop(self, user_id):
+        return self._sessions.pop(user_id, None)
+
+    def state(self, user_id):
+        session = self.get(user_id)
+        return session.state if session else None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def dump(self):
+        now = time.time()
+        return [(uid, s.state, s.targets, s.touched) for uid, s in self._sessions.items() if now - s.touched < self.ttl]
+
+    def load(self, rows):
+        for user_id, state, targets, touched in sorted(rows, key=lambda r: r[3]):
+            self._sessions[user_id] = Session(state, targets, touched)
+        self._evict(time.time())
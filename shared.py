@@ -0,0 +1,133 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+from async_storage import run_io, cancel_task
+
+LEASE_TTL = int(os.getenv("LEASE_TTL", 30))
+ADMIN_REFRESH = float(os.getenv("ADMIN_REFRESH", 5))
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class AdminSet:
+    # عضویت روی هر update (دو بار) بررسی می‌شود، پس از حافظه خوانده می‌شود؛ تغییرات در Storage نوشته
+    # و هر ADMIN_REFRESH ثانیه از آن دوباره خوانده می‌شود تا ادمین‌های تأییدشده در workerهای دیگر هم دیده شوند
+    def __init__(self, storage=None, refresh=ADMIN_REFRESH):
+        self.storage = storage
+        self.refresh = refresh
+        self._ids = set()
+        self._writes = 0
+        self._task = None
+
+    def __contains__(self, user_id):
+        return user_id in self._ids
+
+    async def add(self, user_id):
+        self._ids.add(int(user_id))
+        self._writes += 1
+        if self.storage is not None:
+            await run_io(self.storage.add_admin, user_id)
+
+    async def discard(self, user_id):
+        self._ids.discard(int(user_id))
+        self._writes += 1
+        if self.storage is not None:
+            await run_io(self.storage.remove_admin, user_id)
+
+    async def load(self):
+        if self.storage is None:
+            return
+        writes = self._writes
+        ids = set(await run_io(self.storage.admin_ids))
+        # اگر هم‌زمان با خواندن تغییری در این پردازه ثبت شده، نتیجه کهنه است و دور بعد دوباره خوانده می‌شود
+        if writes == self._writes:
+            self._ids = ids
+
+    def start(self):
+        if self.storage is not None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.load()
+            except Exception as e:
+                logging.warning(f"👤 خواندن لیست ادمین‌ها ناموفق: {e}")
+            await asyncio.sleep(self.refresh)
+
+    async def stop(self):
+        await cancel_task(self._task)
+        self._task = None
+
+
+class LocalSharedState:
+    # جایگزین داخل‌پردازه‌ای برای حالت تک‌پردازه و تست‌ها
+    def __init__(self):
+        self.admins = AdminSet()
+        self._leases = {}
+
+    def acquire(self, name, owner, ttl=LEASE_TTL):
+        now = time.time()
+        holder = self._leases.get(name)
+        if holder is None or holder[0] == owner or holder[1] < now:
+            self._leases[name] = (owner, now + ttl)
+            return True
+        return False
+
+    def release(self, name, owner):
+        if self._leases.get(name, (None,))[0] == owner:
+            del self._leases[name]
+
+
+class SQLiteSharedState:
+    # وضعیت مشترک بین چند پردازه روی یک دیتابیس SQLite (WAL)؛ acquire/release با run_io صدا زده می‌شوند
+    def __init__(self, storage):
+        self.storage = storage
+        self.admins = AdminSet(storage)
+
+    def acquire(self, name, owner, ttl=LEASE_TTL):
+        return self.storage.acquire_lease(name, owner, ttl)
+
+    def release(self, name, owner):
+        self.storage.release_lease(name, owner)
+
+
+class LeaderElector:
+    def __init__(self, shared, name, owner, ttl=LEASE_TTL):
+        self.shared = shared
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.is_leader = False
+        self._task = None
+
+    def start(self, on_elected, on_demoted):
+        self._task = asyncio.create_task(self._run(on_elected, on_demoted))
+
+    async def _run(self, on_elected, on_demoted):
+        while True:
+            try:
+                ok = await run_io(self.shared.acquire, self.name, self.owner, self.ttl)
+            except Exception as e:
+                logging.warning(f"🗳 تمدید lease ناموفق: {e}")
+                ok = False
+            if ok and not self.is_leader:
+                self.is_leader = True
+                logging.info(f"👑 {self.owner} رهبر «{self.name}» شد.")
+                await on_elected()
+            elif not ok and self.is_leader:
+                self.is_leader = False
+                logging.warning(f"🗳 {self.owner} رهبری «{self.name}» را از دست داد.")
+                await on_demoted()
+            await asyncio.sleep(self.ttl / 3)
+
+    async def stop(self):
+        await cancel_task(self._task)
+        self._task = None
+        if self.is_leader:
+            self.is_leader = False
+            await run_io(self.shared.release, self.name, self.owner)
@@ -0,0 +1,615 @@
+import os
+import re
+import sys
+import json
+import sqlite3
+import time
+import logging
+import threading
+from datetime import datetime
+import aggregates
+
+
+class Storage:
+    def add_user(self, user_id, joined=None):
+        raise NotImplementedError
+
+    def has_user(self, user_id):
+        raise NotImplementedError
+
+    def get_user(self, user_id):
+        raise NotImplementedError
+
+    def user_ids(self):
+        raise NotImplementedError
+
+    def count_users(self, before_id=None):
+        raise NotImplementedError
+
+    def page_users(self, after_id=None, before_id=None, limit=50):
+        raise NotImplementedError
+
+    def set_mood(self, user_id, date, slot, score):
+        raise NotImplementedError
+
+    def get_mood(self, user_id, date, slot):
+        raise NotImplementedError
+
+    def get_version(self, user_id):
+        raise NotImplementedError
+
+    def get_aggregate(self, user_id):
+        raise NotImplementedError
+
+    def iter_moods(self, user_id):
+        raise NotImplementedError
+
+    def append_thought(self, user_id, ts, text):
+        raise NotImplementedError
+
+    def iter_thoughts(self, user_id):
+        raise NotImplementedError
+
+    def thoughts_page(self, user_id, before_id=None, limit=5, since=None):
+        raise NotImplementedError
+
+    def search_thoughts(self, user_id, query, before_id=None, limit=5):
+        raise NotImplementedError
+
+    def user_versions(self):
+        raise NotImplementedError
+
+    def iter_users(self):
+        raise NotImplementedError
+
+    def iter_moods_since(self, since, user_ids=None):
+        raise NotImplementedError
+
+    def thoughts_since(self, last_id):
+        raise NotImplementedError
+
+    def delete_thoughts(self, user_id):
+        raise NotImplementedError
+
+    def write_batch(self, moods, thoughts, users=(), replace_thoughts=()):
+        for user_id, joined in users:
+            self.add_user(user_id, joined)
+        for user_id in replace_thoughts:
+            self.delete_thoughts(user_id)
+        for user_id, date, slot, score in moods:
+            self.set_mood(user_id, date, slot, score)
+        for user_id, ts, text in thoughts:
+            self.append_thought(user_id, ts, text)
+
+    def create_broadcast(self, admin_id, text, targets, fail=0):
+        raise NotImplementedError
+
+    def update_broadcast(self, job_id, cursor, success, fail, status="running"):
+        raise NotImplementedError
+
+    def pending_broadcasts(self):
+        raise NotImplementedError
+
+    def save_sessions(self, rows, shard=0, shards=1):
+        raise NotImplementedError
+
+    def load_sessions(self, shard=0, shards=1):
+        raise NotImplementedError
+
+    def outbox_put(self, method, payload, next_at, expires):
+        raise NotImplementedError
+
+    def outbox_due(self, now, limit):
+        raise NotImplementedError
+
+    def outbox_retry(self, row_id, attempts, next_at):
+        raise NotImplementedError
+
+    def outbox_delete(self, row_id):
+        raise NotImplementedError
+
+    def report_candidates(self, min_days, active_since, after, limit):
+        raise NotImplementedError
+
+    def admin_ids(self):
+        raise NotImplementedError
+
+    def add_admin(self, user_id):
+        raise NotImplementedError
+
+    def remove_admin(self, user_id):
+        raise NotImplementedError
+
+    def acquire_lease(self, name, owner, ttl):
+        raise NotImplementedError
+
+    def release_lease(self, name, owner):
+        raise NotImplementedError
+
+    def get_meta(self, key, default=None):
+        raise NotImplementedError
+
+    def set_meta(self, key, value):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# Each entry bumps PRAGMA user_version by one; append, never edit.
+MIGRATIONS = [
+    """
+    CREATE TABLE users (
+        user_id INTEGER PRIMARY KEY,
+        joined TEXT NOT NULL
+    );
+    CREATE TABLE moods (
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        slot TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        PRIMARY KEY (user_id, date, slot)
+    ) WITHOUT ROWID;
+    CREATE TABLE thoughts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        ts TEXT NOT NULL,
+        text TEXT NOT NULL
+    );
+    CREATE INDEX thoughts_user ON thoughts (user_id, id);
+    CREATE TABLE meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """,
+    """
+    ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+    """,
+    """
+    CREATE TABLE broadcasts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        admin_id INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        targets TEXT NOT NULL,
+        cursor INTEGER NOT NULL DEFAULT 0,
+        success INTEGER NOT NULL DEFAULT 0,
+        fail INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'running',
+        created TEXT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE aggregates (
+        user_id INTEGER PRIMARY KEY,
+        data TEXT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE sessions (
+        user_id INTEGER PRIMARY KEY,
+        state INTEGER,
+        targets TEXT,
+        touched REAL NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE admins (
+        user_id INTEGER PRIMARY KEY
+    );
+    CREATE TABLE leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires REAL NOT NULL
+    );
+    """,
+    """
+    CREATE INDEX thoughts_user_ts ON thoughts (user_id, ts, id);
+    CREATE VIRTUAL TABLE thoughts_fts USING fts5(
+        text, user_id, content='thoughts', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    );
+    INSERT INTO thoughts_fts (thoughts_fts) VALUES ('rebuild');
+    CREATE TRIGGER thoughts_fts_insert AFTER INSERT ON thoughts BEGIN
+        INSERT INTO thoughts_fts (rowid, text, user_id) VALUES (new.id, new.text, new.user_id);
+    END;
+    CREATE TRIGGER thoughts_fts_delete AFTER DELETE ON thoughts BEGIN
+        INSERT INTO thoughts_fts (thoughts_fts, rowid, text, user_id) VALUES ('delete', old.id, old.text, old.user_id);
+    END;
+    """,
+    """
+    CREATE TABLE outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        method TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_at REAL NOT NULL,
+        expires REAL NOT NULL
+    );
+    CREATE INDEX outbox_next ON outbox (next_at);
+    """,
+    """
+    CREATE TABLE reports (
+        user_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        png BLOB NOT NULL,
+        PRIMARY KEY (user_id, kind)
+    );
+    """,
+    """
+    DROP TABLE reports;
+    """,
+]
+
+
+# سیاست fsync در SQLite همان PRAGMA synchronous است: off / normal / full
+FSYNC_POLICIES = {"off": "OFF", "normal": "NORMAL", "full": "FULL"}
+
+
+class SQLiteStorage(Storage):
+    def __init__(self, path, fsync="normal"):
+        self.path = path
+        self.synchronous = FSYNC_POLICIES[fsync]
+        self._local = threading.local()
+        self._conns = []
+        self._conns_lock = threading.Lock()
+        self._migrate()
+        if not self.get_meta("aggregates_built"):
+            self.rebuild_aggregates()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def _migrate(self):
+        conn = self._conn()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for i, script in enumerate(MIGRATIONS[version:], start=version + 1):
+            with conn:
+                conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {i};\nCOMMIT;")
+            logging.info(f"🗄 پایگاه داده به نسخه {i} رسید.")
+
+    def add_user(self, user_id, joined=None):
+        joined = joined or datetime.now().isoformat()
+        with self._conn() as conn:
+            cur = conn.execute("INSERT OR IGNORE INTO users (user_id, joined) VALUES (?, ?)", (int(user_id), joined))
+        return cur.rowcount > 0
+
+    def has_user(self, user_id):
+        row = self._conn().execute("SELECT 1 FROM users WHERE user_id = ?", (int(user_id),)).fetchone()
+        return row is not None
+
+    def get_user(self, user_id):
+        conn = self._conn()
+        row = conn.execute("SELECT joined FROM users WHERE user_id = ?", (int(user_id),)).fetchone()
+        if row is None:
+            return None
+        moods = {}
+        for date, slot, score in conn.execute(
+                "SELECT date, slot, score FROM moods WHERE user_id = ? ORDER BY date", (int(user_id),)):
+            moods.setdefault(date, {})[slot] = score
+        return {"joined": row[0], "moods": moods}
+
+    def user_ids(self):
+        return [r[0] for r in self._conn().execute("SELECT user_id FROM users ORDER BY user_id")]
+
+    def count_users(self, before_id=None):
+        if before_id is None:
+            return self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        return self._conn().execute("SELECT COUNT(*) FROM users WHERE user_id < ?", (int(before_id),)).fetchone()[0]
+
+    def page_users(self, after_id=None, before_id=None, limit=50):
+        # keyset روی کلید اصلی؛ before_id برای صفحه قبل (نزولی خوانده و برگردانده می‌شود)
+        if before_id is not None:
+            rows = self._conn().execute("SELECT user_id FROM users WHERE user_id < ? ORDER BY user_id DESC LIMIT ?",
+                                        (int(before_id), limit)).fetchall()
+            return [r[0] for r in reversed(rows)]
+        return [r[0] for r in self._conn().execute("SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                                                   (int(after_id or 0), limit))]
+
+    def set_mood(self, user_id, date, slot, score):
+        with self._conn() as conn:
+            self._set_mood(conn, user_id, date, slot, score)
+
+    def _set_mood(self, conn, user_id, date, slot, score):
+        user_id, score = int(user_id), int(score)
+        old = conn.execute("SELECT score FROM moods WHERE user_id = ? AND date = ? AND slot = ?",
+                           (user_id, date, slot)).fetchone()
+        new_day = old is None and conn.execute(
+            "SELECT 1 FROM moods WHERE user_id = ? AND date = ? LIMIT 1", (user_id, date)).fetchone() is None
+        conn.execute(
+            "INSERT OR REPLACE INTO moods (user_id, date, slot, score) VALUES (?, ?, ?, ?)",
+            (user_id, date, slot, score))
+        agg = self._load_aggregate(conn, user_id) or aggregates.empty()
+        aggregates.apply(agg, date, slot, score, old[0] if old else None, new_day)
+        conn.execute("INSERT OR REPLACE INTO aggregates (user_id, data) VALUES (?, ?)", (user_id, json.dumps(agg)))
+        # گزارش از پیش ساخته‌شده با version کلید می‌خورد و با هر نمره جدید باطل می‌شود
+        conn.execute("UPDATE users SET version = version + 1 WHERE user_id = ?", (user_id,))
+
+    def _load_aggregate(self, conn, user_id):
+        row = conn.execute("SELECT data FROM aggregates WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_aggregate(self, user_id):
+        return self._load_aggregate(self._conn(), int(user_id)) or aggregates.empty()
+
+    def rebuild_aggregates(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM aggregates")
+            agg, current, last_date = None, None, None
+            rows = conn.execute("SELECT user_id, date, slot, score FROM moods ORDER BY user_id, date")
+            for user_id, date, slot, score in rows:
+                if user_id != current:
+                    if agg is not None:
+                        conn.execute("INSERT INTO aggregates (user_id, data) VALUES (?, ?)", (current, json.dumps(agg)))
+                    agg, current, last_date = aggregates.empty(), user_id, None
+                aggregates.apply(agg, date, slot, score, new_day=date != last_date)
+                last_date = date
+            if agg is not None:
+                conn.execute("INSERT INTO aggregates (user_id, data) VALUES (?, ?)", (current, json.dumps(agg)))
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('aggregates_built', ?)",
+                         (datetime.now().isoformat(),))
+
+    def get_mood(self, user_id, date, slot):
+        row = self._conn().execute(
+            "SELECT score FROM moods WHERE user_id = ? AND date = ? AND slot = ?",
+            (int(user_id), date, slot)).fetchone()
+        return row[0] if row else None
+
+    def get_version(self, user_id):
+        row = self._conn().execute("SELECT version FROM users WHERE user_id = ?", (int(user_id),)).fetchone()
+        return row[0] if row else None
+
+    def iter_moods(self, user_id):
+        yield from self._conn().execute(
+            "SELECT date, slot, score FROM moods WHERE user_id = ? ORDER BY date", (int(user_id),))
+
+    def append_thought(self, user_id, ts, text):
+        with self._conn() as conn:
+            conn.execute("INSERT INTO thoughts (user_id, ts, text) VALUES (?, ?, ?)", (int(user_id), str(ts), text))
+
+    def delete_thoughts(self, user_id):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM thoughts WHERE user_id = ?", (int(user_id),))
+
+    def write_batch(self, moods, thoughts, users=(), replace_thoughts=()):
+        # users و replace_thoughts برای import یک‌جا: کاربران ساخته و افکار قبلی‌شان در همان تراکنش پاک می‌شود
+        with self._conn() as conn:
+            now = datetime.now().isoformat()
+            conn.executemany("INSERT OR IGNORE INTO users (user_id, joined) VALUES (?, ?)",
+                             [(int(uid), joined or now) for uid, joined in users])
+            conn.executemany("DELETE FROM thoughts WHERE user_id = ?", [(int(uid),) for uid in replace_thoughts])
+            for user_id, date, slot, score in moods:
+                self._set_mood(conn, user_id, date, slot, score)
+            conn.executemany("INSERT INTO thoughts (user_id, ts, text) VALUES (?, ?, ?)",
+                             [(int(uid), str(ts), text) for uid, ts, text in thoughts])
+
+    def iter_thoughts(self, user_id):
+        yield from self._conn().execute(
+            "SELECT ts, text FROM thoughts WHERE user_id = ? ORDER BY id", (int(user_id),))
+
+    def thoughts_page(self, user_id, before_id=None, limit=5, since=None):
+        # keyset روی (ts, id) با ایندکس thoughts_user_ts؛ هزینه هر صفحه به اندازه خود صفحه است
+        sql = "SELECT id, ts, text FROM thoughts WHERE user_id = ?"
+        params = [int(user_id)]
+        if since is not None:
+            sql += " AND ts >= ?"
+            params.append(str(since))
+        if before_id is not None:
+            sql += " AND (ts, id) < (SELECT ts, id FROM thoughts WHERE id = ?)"
+            params.append(int(before_id))
+        sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(limit)
+        return self._conn().execute(sql, params).fetchall()
+
+    def search_thoughts(self, user_id, query, before_id=None, limit=5):
+        # هر کلمه به صورت پیشوندی و داخل کوتیشن جستجو می‌شود تا کاراکترهای خاص FTS از ورودی کاربر اثر نکنند
+        terms = ['"' + t.replace('"', '""') + '"*' for t in query.split()]
+        if not terms:
+            return []
+        # کلمات فقط در ستون text جستجو می‌شوند؛ وگرنه عددی مثل آیدی کاربر دیگر با ستون user_id هم جور می‌شود
+        match = f'user_id : "{int(user_id)}" AND text : (' + " AND ".join(terms) + ")"
+        sql = ("SELECT t.id, t.ts, t.text FROM thoughts_fts JOIN thoughts t ON t.id = thoughts_fts.rowid "
+               "WHERE thoughts_fts MATCH ?")
+        params = [match]
+        if before_id is not None:
+            sql += " AND thoughts_fts.rowid < ?"
+            params.append(int(before_id))
+        sql += " ORDER BY thoughts_fts.rowid DESC LIMIT ?"
+        params.append(limit)
+        return self._conn().execute(sql, params).fetchall()
+
+    def user_versions(self):
+        yield from self._conn().execute("SELECT user_id, version FROM users")
+
+    def iter_users(self):
+        yield from self._conn().execute("SELECT user_id, joined, version FROM users")
+
+    def iter_moods_since(self, since, user_ids=None):
+        if user_ids is None:
+            yield from self._conn().execute("SELECT user_id, date, slot, score FROM moods WHERE date >= ?", (since,))
+            return
+        user_ids = [int(u) for u in user_ids]
+        # محدودیت تعداد پارامترهای SQLite
+        for i in range(0, len(user_ids), 500):
+            chunk = user_ids[i:i + 500]
+            yield from self._conn().execute(
+                f"SELECT user_id, date, slot, score FROM moods WHERE user_id IN ({','.join('?' * len(chunk))}) "
+                "AND date >= ?", (*chunk, since))
+
+    def thoughts_since(self, last_id):
+        yield from self._conn().execute(
+            "SELECT id, user_id, ts, text FROM thoughts WHERE id > ? ORDER BY user_id, id", (last_id,))
+
+    def create_broadcast(self, admin_id, text, targets, fail=0):
+        with self._conn() as conn:
+            cur = conn.execute(
+                "INSERT INTO broadcasts (admin_id, text, targets, fail, created) VALUES (?, ?, ?, ?, ?)",
+                (int(admin_id), text, json.dumps([int(t) for t in targets]), fail, datetime.now().isoformat()))
+        return cur.lastrowid
+
+    def update_broadcast(self, job_id, cursor, success, fail, status="running"):
+        with self._conn() as conn:
+            conn.execute("UPDATE broadcasts SET cursor = ?, success = ?, fail = ?, status = ? WHERE id = ?",
+                         (cursor, success, fail, status, job_id))
+
+    def pending_broadcasts(self):
+        rows = self._conn().execute(
+            "SELECT id, admin_id, text, targets, cursor, success, fail FROM broadcasts WHERE status = 'running' ORDER BY id")
+        return [{"id": r[0], "admin_id": r[1], "text": r[2], "targets": json.loads(r[3]),
+                 "cursor": r[4], "success": r[5], "fail": r[6]} for r in rows]
+
+    def save_sessions(self, rows, shard=0, shards=1):
+        # هر worker فقط نشست‌های shard خودش را بازنویسی می‌کند
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE user_id % ? = ?", (shards, shard))
+            conn.executemany("INSERT INTO sessions (user_id, state, targets, touched) VALUES (?, ?, ?, ?)",
+                             [(uid, state, json.dumps(targets), touched) for uid, state, targets, touched in rows])
+
+    def load_sessions(self, shard=0, shards=1):
+        rows = self._conn().execute("SELECT user_id, state, targets, touched FROM sessions WHERE user_id % ? = ?",
+                                    (shards, shard))
+        return [(uid, state, json.loads(targets), touched) for uid, state, targets, touched in rows]
+
+    def outbox_put(self, method, payload, next_at, expires):
+        with self._conn() as conn:
+            conn.execute("INSERT INTO outbox (method, payload, next_at, expires) VALUES (?, ?, ?, ?)",
+                         (method, payload, next_at, expires))
+
+    def outbox_due(self, now, limit):
+        return self._conn().execute(
+            "SELECT id, method, payload, attempts, expires FROM outbox WHERE next_at <= ? ORDER BY next_at, id LIMIT ?",
+            (now, limit)).fetchall()
+
+    def outbox_retry(self, row_id, attempts, next_at):
+        with self._conn() as conn:
+            conn.execute("UPDATE outbox SET attempts = ?, next_at = ? WHERE id = ?", (attempts, next_at, row_id))
+
+    def outbox_delete(self, row_id):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+
+    def report_candidates(self, min_days, active_since, after, limit):
+        # کاربران واجد شرایط و اخیراً فعال با version فعلی‌شان؛ صفحه‌بندی روی user_id
+        rows = self._conn().execute(
+            "SELECT u.user_id, u.version, a.data FROM users u JOIN aggregates a ON a.user_id = u.user_id "
+            "WHERE u.user_id > ? AND json_extract(a.data, '$.active_days') >= ? "
+            "AND json_extract(a.data, '$.last_day') >= ? ORDER BY u.user_id LIMIT ?",
+            (after, min_days, active_since, limit))
+        return [(uid, version, json.loads(data)) for uid, version, data in rows]
+
+    def admin_ids(self):
+        return [r[0] for r in self._conn().execute("SELECT user_id FROM admins")]
+
+    def add_admin(self, user_id):
+        with self._conn() as conn:
+            conn.execute("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (int(user_id),))
+
+    def remove_admin(self, user_id):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM admins WHERE user_id = ?", (int(user_id),))
+
+    def acquire_lease(self, name, owner, ttl):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("INSERT OR IGNORE INTO leases (name, owner, expires) VALUES (?, ?, ?)", (name, owner, now + ttl))
+            cur = conn.execute("UPDATE leases SET owner = ?, expires = ? WHERE name = ? AND (owner = ? OR expires < ?)",
+                               (owner, now + ttl, name, owner, now))
+        return cur.rowcount > 0
+
+    def release_lease(self, name, owner):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def get_meta(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def close(self):
+        with self._conns_lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+        self._local = threading.local()
+
+
+BACKENDS = {"sqlite": SQLiteStorage}
+
+
+def open_storage(url, **options):
+    scheme, sep, path = url.partition("://")
+    if not sep:
+        scheme, path = "sqlite", url
+    return BACKENDS[scheme](path, **options)
+
+
+THOUGHT_LINE = re.compile(r"^\[(\d{4}-\d{2}-\d{2} [\d:.]+)\] (.*)$")
+
+
+def read_thought_file(path):
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            m = THOUGHT_LINE.match(line)
+            if m:
+                entries.append([m.group(1), m.group(2)])
+            elif entries:
+                # متن‌های چندخطی در فایل قدیمی بدون تایم‌استمپ ادامه پیدا می‌کنند
+                entries[-1][1] += "\n" + line
+    return entries
+
+
+def migrate_files(storage, data_folder, thoughts_folder, force=False):
+    if storage.get_meta("files_migrated") and not force:
+        return 0
+    # کل import در یک تراکنش write_batch انجام می‌شود؛ افکار هر کاربر جایگزین می‌شوند تا اجرای دوباره
+    # (یا --force) آنها را تکراری نکند. نمره‌ها با کلید (user_id, date, slot) خودبه‌خود بازنویسی می‌شوند.
+    users, moods, thoughts, replaced = {}, [], [], []
+    if os.path.isdir(data_folder):
+        for filename in os.listdir(data_folder):
+            uid = filename[:-len(".json")]
+            if not filename.endswith(".json") or not uid.isdigit():
+                continue
+            with open(os.path.join(data_folder, filename), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            users[uid] = data.get("joined")
+            for date, slots in data.get("moods", {}).items():
+                for slot, score in slots.items():
+                    moods.append((uid, date, slot, score))
+    count = len(users)
+    if os.path.isdir(thoughts_folder):
+        for filename in os.listdir(thoughts_folder):
+            uid = filename[:-len(".txt")]
+            if not filename.endswith(".txt") or not uid.isdigit():
+                continue
+            users.setdefault(uid, None)
+            replaced.append(uid)
+            for ts, text in read_thought_file(os.path.join(thoughts_folder, filename)):
+                thoughts.append((uid, ts, text))
+    storage.write_batch(moods, thoughts, users=users.items(), replace_thoughts=replaced)
+    storage.set_meta("files_migrated", datetime.now().isoformat())
+    return count
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("usage: python storage.py migrate [--force]")
+        sys.exit(1)
+    store = open_storage(os.getenv("DB_PATH", "moods.db"))
+    n = migrate_files(store, "userdata", "thoughts", force="--force" in sys.argv)
+    print(f"migrated {n} users")
+    store.close()
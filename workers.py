@@ -0,0 +1,97 @@
+import json
+import asyncio
+import logging
+import signal
+import multiprocessing
+from telegram import Bot, Update
+from telegram.error import TelegramError
+from resilience import backoff
+
+WORKER_CHECK_INTERVAL = 5
+
+
+def shard_for(data, shards):
+    # آیدی کاربر در همه انواع آپدیت زیر کلید from است (message، callback_query و ...)
+    for value in data.values():
+        if isinstance(value, dict) and isinstance(value.get("from"), dict):
+            return value["from"]["id"] % shards
+    return 0
+
+
+def worker_main(shard, shards, queue):
+    # خاموش شدن worker ها را والد با فرستادن None کنترل می‌کند، نه سیگنال‌های گروه پردازه
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, signal.SIG_IGN)
+    import mood_tracker_bot as bot
+    logging.basicConfig(level=logging.INFO, format=f"[worker {shard}] %(levelname)s %(message)s")
+    asyncio.run(bot.run_worker(shard, shards, queue))
+
+
+class WorkerPool:
+    def __init__(self, shards):
+        self.shards = shards
+        self._ctx = multiprocessing.get_context("spawn")
+        self.queues = [self._ctx.Queue() for _ in range(shards)]
+        self.procs = [None] * shards
+
+    def _spawn(self, shard):
+        proc = self._ctx.Process(target=worker_main, args=(shard, self.shards, self.queues[shard]),
+                                 name=f"worker-{shard}", daemon=True)
+        proc.start()
+        self.procs[shard] = proc
+
+    def start(self):
+        for shard in range(self.shards):
+            self._spawn(shard)
+
+    def dispatch(self, data):
+        self.queues[shard_for(data, self.shards)].put(json.dumps(data))
+
+    async def supervise(self):
+        while True:
+            await asyncio.sleep(WORKER_CHECK_INTERVAL)
+            for shard, proc in enumerate(self.procs):
+                if not proc.is_alive():
+                    logging.error(f"💀 worker {shard} با کد {proc.exitcode} متوقف شد؛ راه‌اندازی دوباره.")
+                    self._spawn(shard)
+
+    async def stop(self, timeout=30):
+        for queue in self.queues:
+            queue.put(None)
+        for proc in self.procs:
+            await asyncio.to_thread(proc.join, timeout)
+            if proc.is_alive():
+                proc.terminate()
+
+
+def webhook_ingress(pool, secret):
+    async def handle(request):
+        if secret and request.headers.get("x-telegram-bot-api-secret-token") != secret:
+            return 403, "text/plain", b"forbidden"
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return 400, "text/plain", b"bad json"
+        pool.dispatch(data)
+        return 200, "text/plain", b"ok"
+    return handle
+
+
+async def polling_ingress(bot: Bot, pool, timeout=30):
+    offset = 0
+    failures = 0
+    while True:
+        try:
+            # get_updates خودش timeout را به read_timeout اضافه می‌کند
+            updates = await bot.get_updates(offset=offset, timeout=timeout, read_timeout=10,
+                                            allowed_updates=Update.ALL_TYPES)
+        except TelegramError as e:
+            delay = backoff(failures, cap=30)
+            failures += 1
+            logging.warning(f"🔄 خطا در دریافت آپدیت‌ها: {e} (تلاش دوباره تا {delay:.1f} ثانیه دیگر)")
+            await asyncio.sleep(delay)
+            continue
+        failures = 0
+        for update in updates:
+            pool.dispatch(update.to_dict())
+            offset = update.update_id + 1
@@ -0,0 +1,80 @@
+import os
+import time
+import asyncio
+import logging
+from async_storage import run_io
+from metrics import STORAGE_LATENCY, timed
+
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", 500))
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", 1.0))
+FLUSH_ATTEMPTS = 3
+_STOP = ("stop", None)
+
+
+class WriteBehind:
+    # نوشتن‌ها در صف جمع می‌شوند و با رسیدن به سقف تعداد یا زمان، در یک تراکنش ذخیره می‌شوند
+    def __init__(self, storage, batch_size=WRITE_BATCH_SIZE, interval=WRITE_FLUSH_INTERVAL):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def add_mood(self, user_id, date, slot, score):
+        await self._queue.put(("mood", (user_id, date, slot, score)))
+
+    async def add_thought(self, user_id, ts, text):
+        await self._queue.put(("thought", (user_id, ts, text)))
+
+    async def _collect(self):
+        items = [await self._queue.get()]
+        deadline = time.monotonic() + self.interval
+        while len(items) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self):
+        while True:
+            items = await self._collect()
+            stop = _STOP in items
+            if stop:
+                items = [i for i in items if i is not _STOP]
+            if items:
+                await self._flush(items)
+            if stop:
+                return
+
+    async def _flush(self, items):
+        moods = [v for kind, v in items if kind == "mood"]
+        thoughts = [v for kind, v in items if kind == "thought"]
+        for attempt in range(FLUSH_ATTEMPTS):
+            try:
+                with timed(STORAGE_LATENCY, op="write_batch"):
+                    await run_io(self.storage.write_batch, moods, thoughts)
+                return
+            except Exception as e:
+                logging.warning(f"💾 ذخیره دسته‌ای ناموفق ({attempt + 1}/{FLUSH_ATTEMPTS}): {e}")
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        # اگر کل دسته شکست خورد، تک‌تک ذخیره می‌کنیم تا یک رکورد خراب بقیه را از بین نبرد
+        for kind, v in items:
+            try:
+                await run_io(self.storage.write_batch, [v] if kind == "mood" else [], [v] if kind == "thought" else [])
+            except Exception as e:
+                logging.error(f"🗑 رکورد {kind} ذخیره نشد: {v!r} ({e})")
+
+    async def close(self):
+        # صف تا آخر خالی می‌شود؛ چیزی که قبل از خاموشی ثبت شده از دست نمی‌رود
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None